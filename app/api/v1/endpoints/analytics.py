@@ -1,19 +1,82 @@
 # app/api/v1/endpoints/analytics.py
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request, Response, Depends, BackgroundTasks
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Iterator, List, Optional
 import os
+import shutil
+import orjson
+import numpy as np
 import pandas as pd
-from app.services.trade_parser_service import TradeParserService
-from app.services.analytics_service import AnalyticsService
+from app.services.cache import (
+    LatestFile, get_latest_file, set_latest_file,
+    get_cached_analytics, get_cached_table, get_cached_json, precompute
+)
+from app.services.latest_csv import RAW_DATA_DIR
+from app.services.kernels import hourly_stats, best_bucket
+from app.services.trade_table import TradeTable
 from app.schemas.analytics import Analytics
 from app.schemas.trade import Trade
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MB
+NDJSON_BATCH_SIZE = 1000  # filas materializadas por bloque al hacer streaming
+CACHE_CONTROL = "private, max-age=5"
+
+
+def _cache_headers(latest: LatestFile) -> Dict[str, str]:
+    """ETag (versión del archivo: mtime_ns + tamaño) y Cache-Control de las respuestas GET"""
+    _, mtime_ns, size = latest
+    return {'ETag': f'W/"{mtime_ns:x}-{size:x}"', 'Cache-Control': CACHE_CONTROL}
+
+
+def etag_dep(request: Request, response: Response) -> Optional[LatestFile]:
+    """
+    Dependency de ETag para los GET de analytics.
+    
+    Todas las respuestas dependen solo de la versión del archivo más reciente,
+    así que si el cliente ya la tiene (If-None-Match) se responde 304 sin
+    tocar el cache ni recalcular nada.
+    
+    Returns:
+        Tupla (path, mtime_ns, size) del archivo más reciente o None si no hay archivos
+        
+    Raises:
+        HTTPException 304 si el ETag del cliente coincide
+    """
+    latest = get_latest_file()
+    if latest is None:
+        return None
+    
+    headers = _cache_headers(latest)
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        client_tags = {tag.strip() for tag in if_none_match.split(',')}
+        if headers['ETag'] in client_tags or '*' in client_tags:
+            raise HTTPException(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return latest
+
+
+async def _cached_json_response(latest: LatestFile, view: str) -> Response:
+    """Responder con el JSON cacheado de una vista de analytics (con ETag y Cache-Control)"""
+    content = await run_in_threadpool(get_cached_json, latest, view)
+    return Response(content=content, media_type='application/json', headers=_cache_headers(latest))
+
+
+def _latest_file_or_404(latest: Optional[LatestFile]) -> LatestFile:
+    """Lanzar 404 si no hay ningún archivo de operaciones"""
+    if latest is None:
+        raise HTTPException(status_code=404, detail="No se encontraron archivos. Por favor sube un archivo primero.")
+    return latest
+
+
 # UPLOAD
 @router.post('/upload-trades')
-async def upload_trades_file(file: UploadFile = File(...)):
+async def upload_trades_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     Subir archivo CSV o XLSX de operaciones MT5.
     
@@ -27,22 +90,26 @@ async def upload_trades_file(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail=f"Formato no soportado. Use: {', '.join(allowed_extensions)}")
         
         # Guardar archivo
-        upload_dir = "data/raw"
+        upload_dir = RAW_DATA_DIR
         os.makedirs(upload_dir, exist_ok=True)
         
+        # Copiar por bloques de 1 MB en el threadpool (sin cargar el archivo entero en RAM)
         file_path = f"{upload_dir}/{file.filename}"
         with open(file_path, 'wb') as f:
-            content = await file.read()
-            f.write(content)
+            await run_in_threadpool(shutil.copyfileobj, file.file, f, UPLOAD_CHUNK_SIZE)
         
-        # Parsear
-        trades = TradeParserService.load_trades_from_file(file_path)
+        # Parsear en el threadpool (deja el archivo nuevo en cache para los siguientes GET)
+        latest = set_latest_file(file_path)
+        table = await run_in_threadpool(get_cached_table, latest)
+        
+        # Precalcular analytics (y su snapshot en disco) después de responder
+        background_tasks.add_task(precompute, latest)
         
         return {
             'success': True,
-            'trades_count': len(trades),
+            'trades_count': len(table),
             'file_path': file_path,
-            'message': f'✅ {len(trades)} operaciones cargadas exitosamente'
+            'message': f'✅ {len(table)} operaciones cargadas exitosamente'
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -54,7 +121,8 @@ async def get_trades(
     limit: Optional[int] = Query(None, description="Límite de operaciones a retornar"),
     offset: Optional[int] = Query(0, description="Offset para paginación"),
     symbol: Optional[str] = Query(None, description="Filtrar por símbolo"),
-    status: Optional[str] = Query(None, description="Filtrar por estado (GANADOR/PERDEDOR/BREAK_EVEN)")
+    status: Optional[str] = Query(None, description="Filtrar por estado (GANADOR/PERDEDOR/BREAK_EVEN)"),
+    latest: Optional[LatestFile] = Depends(etag_dep)
 ):
     """
     Obtener lista de todas las operaciones.
@@ -66,36 +134,30 @@ async def get_trades(
     - offset: Paginación
     """
     try:
-        # Buscar archivos en data/raw
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos. Por favor sube un archivo primero.")
-        
-        # Usar el archivo más reciente
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
+        latest = _latest_file_or_404(latest)
+        table = await run_in_threadpool(get_cached_table, latest)
         
         # Filtrar
+        mask = table.all()
         if symbol:
-            trades = [t for t in trades if t.symbol == symbol]
+            mask &= table.symbol_mask(symbol)
         if status:
-            trades = [t for t in trades if t.status == status]
+            mask &= table.status_mask(status)
+        rows = np.flatnonzero(mask)
         
         # Paginación
         if limit:
-            trades = trades[offset:offset+limit]
+            rows = rows[offset:offset+limit]
         
-        return trades
+        # Solo se construyen modelos Trade para las filas devueltas
+        return table.to_models(rows)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ANALYTICS GENERAL
 @router.get('/summary', response_model=Analytics)
-async def get_analytics_summary():
+async def get_analytics_summary(latest: Optional[LatestFile] = Depends(etag_dep)):
     """
     Obtener resumen analítico completo con todos los KPIs.
     
@@ -107,67 +169,72 @@ async def get_analytics_summary():
     - Series temporales
     """
     try:
-        # Buscar archivos en data/raw
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos. Por favor sube un archivo primero.")
-        
-        # Usar el archivo más reciente
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        TradeParserService.validate_trade_data(trades)
-        analytics = AnalyticsService.calculate_all_analytics(trades)
-        return analytics
+        latest = _latest_file_or_404(latest)
+        # En un cache miss se parsea y se calcula: fuera del event loop
+        # El JSON se genera una vez por versión del archivo; devolver el modelo
+        # haría que FastAPI lo revalidara y serializara en cada request
+        return await _cached_json_response(latest, 'summary')
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _ndjson_lines(table: TradeTable, rows: np.ndarray) -> Iterator[bytes]:
+    """Emitir una operación por línea (NDJSON), materializando bloques de NDJSON_BATCH_SIZE filas"""
+    for start in range(0, len(rows), NDJSON_BATCH_SIZE):
+        batch = table.to_records(rows[start:start + NDJSON_BATCH_SIZE])
+        yield b''.join(orjson.dumps(record) + b'\n' for record in batch)
+
+
 # FILTRADO AVANZADO
-@router.get('/filter')
+@router.get('/filter', response_class=ORJSONResponse)
 async def filter_trades(
     symbol: Optional[str] = None,
     status: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     min_profit: Optional[float] = None,
-    max_profit: Optional[float] = None
+    max_profit: Optional[float] = None,
+    format: str = Query('json', description="Formato de respuesta (json, ndjson)"),
+    latest: Optional[LatestFile] = Depends(etag_dep)
 ):
     """
     Filtrar operaciones por criterios múltiples.
     
+    Con format=ndjson las operaciones se envían en streaming, una por línea
+    (application/x-ndjson), y el total va en el header X-Results-Count.
+    
     Ejemplo:
     GET /api/v1/analytics/filter?symbol=EURUSD&status=GANADOR&min_profit=100
     """
     try:
-        # Buscar archivos en data/raw
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos")
-        
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        df = pd.DataFrame([t.model_dump() for t in trades])
+        latest = _latest_file_or_404(latest)
+        table = await run_in_threadpool(get_cached_table, latest)
         
+        # Combinar todos los filtros en una sola máscara vectorizada
+        mask = table.all()
         if symbol:
-            df = df[df['symbol'] == symbol]
+            mask &= table.symbol_mask(symbol)
         if status:
-            df = df[df['status'] == status]
+            mask &= table.status_mask(status)
         if date_from:
-            df = df[df['open_time'] >= date_from]
+            mask &= table.open_time_ns >= pd.Timestamp(date_from).value
         if date_to:
-            df = df[df['open_time'] <= date_to]
+            mask &= table.open_time_ns <= pd.Timestamp(date_to).value
         if min_profit is not None:
-            df = df[df['profit_usd'] >= min_profit]
+            mask &= table.profit_usd >= min_profit
         if max_profit is not None:
-            df = df[df['profit_usd'] <= max_profit]
-        
-        return {
+            mask &= table.profit_usd <= max_profit
+        rows = np.flatnonzero(mask)
+        
+        if format == 'ndjson':
+            return StreamingResponse(
+                _ndjson_lines(table, rows),
+                media_type='application/x-ndjson',
+                headers={**_cache_headers(latest), 'X-Results-Count': str(len(rows))}
+            )
+        
+        # Escalares nativos directo a orjson, sin pasar por jsonable_encoder
+        return ORJSONResponse(content={
             'filters_applied': {
                 'symbol': symbol,
                 'status': status,
@@ -176,9 +243,9 @@ async def filter_trades(
                 'min_profit': min_profit,
                 'max_profit': max_profit
             },
-            'results_count': len(df),
-            'trades': df.to_dict('records')
-        }
+            'results_count': len(rows),
+            'trades': table.to_records(rows)
+        }, headers=_cache_headers(latest))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -187,7 +254,8 @@ async def filter_trades(
 @router.get('/timeseries')
 async def get_timeseries(
     metric: str = Query('equity', description="Métrica a obtener (equity, daily_profit, cumulative_profit)"),
-    groupby: str = Query('day', description="Agrupación (day, week, month)")
+    groupby: str = Query('day', description="Agrupación (day, week, month)"),
+    latest: Optional[LatestFile] = Depends(etag_dep)
 ):
     """
     Obtener serie temporal para gráficos.
@@ -197,16 +265,8 @@ async def get_timeseries(
     GET /api/v1/analytics/timeseries?metric=daily_profit&groupby=week
     """
     try:
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos")
-        
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        analytics = AnalyticsService.calculate_all_analytics(trades)
+        latest = _latest_file_or_404(latest)
+        analytics = await run_in_threadpool(get_cached_analytics, latest)
         
         return {
             'metric': metric,
@@ -220,67 +280,41 @@ async def get_timeseries(
 
 # ESTADÍSTICAS POR SÍMBOLO
 @router.get('/by-symbol')
-async def get_symbol_stats():
+async def get_symbol_stats(latest: Optional[LatestFile] = Depends(etag_dep)):
     """
     Obtener estadísticas desglosadas por par (EURUSD, GBPUSD, etc).
     """
     try:
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos")
-        
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        analytics = AnalyticsService.calculate_all_analytics(trades)
-        
-        return {
-            'symbols': analytics.symbol_stats,
-            'total_symbols': len(analytics.symbol_stats)
-        }
+        latest = _latest_file_or_404(latest)
+        return await _cached_json_response(latest, 'by-symbol')
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # HEATMAP HORARIO
 @router.get('/hourly-heatmap')
-async def get_hourly_heatmap():
+async def get_hourly_heatmap(latest: Optional[LatestFile] = Depends(etag_dep)):
     """
     Obtener rentabilidad por hora del día para heatmap.
     """
     try:
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos")
-        
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        df = pd.DataFrame([t.model_dump() for t in trades])
-        df['open_time'] = pd.to_datetime(df['open_time'])
-        df['hour'] = df['open_time'].dt.hour
-        
-        hourly_stats = df.groupby('hour').agg({
-            'profit_usd': ['sum', 'mean', 'count']
-        }).round(2)
+        latest = _latest_file_or_404(latest)
+        table = await run_in_threadpool(get_cached_table, latest)
+        sums, counts = hourly_stats(table.open_hours(), table.profit_usd)
         
         # Convertir a formato serializable
         result = {}
         for hour in range(24):
-            if hour in hourly_stats.index:
+            if counts[hour] > 0:
                 result[str(hour)] = {
-                    'total': float(hourly_stats.loc[hour, ('profit_usd', 'sum')]),
-                    'average': float(hourly_stats.loc[hour, ('profit_usd', 'mean')]),
-                    'count': int(hourly_stats.loc[hour, ('profit_usd', 'count')])
+                    'total': float(np.round(sums[hour], 2)),
+                    'average': float(np.round(sums[hour] / counts[hour], 2)),
+                    'count': int(counts[hour])
                 }
             else:
                 result[str(hour)] = {'total': 0, 'average': 0, 'count': 0}
         
-        best_hour = int(df.groupby('hour')['profit_usd'].mean().idxmax()) if len(df) > 0 else 0
+        best_hour = best_bucket(sums, counts)
         
         return {
             'data': result,
@@ -292,49 +326,25 @@ async def get_hourly_heatmap():
 
 # ESTADÍSTICAS DIARIAS
 @router.get('/daily-stats')
-async def get_daily_stats():
+async def get_daily_stats(latest: Optional[LatestFile] = Depends(etag_dep)):
     """
     Obtener estadísticas diarias.
     """
     try:
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos")
-        
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        analytics = AnalyticsService.calculate_all_analytics(trades)
-        
-        return {
-            'daily_stats': analytics.daily_stats
-        }
+        latest = _latest_file_or_404(latest)
+        return await _cached_json_response(latest, 'daily-stats')
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ESTADÍSTICAS MENSUALES
 @router.get('/monthly-stats')
-async def get_monthly_stats():
+async def get_monthly_stats(latest: Optional[LatestFile] = Depends(etag_dep)):
     """
     Obtener estadísticas mensuales.
     """
     try:
-        raw_dir = "data/raw"
-        data_files = [f for f in os.listdir(raw_dir) if f.endswith(('.csv', '.xlsx', '.xls'))]
-        
-        if not data_files:
-            raise HTTPException(status_code=404, detail="No se encontraron archivos")
-        
-        latest_file = max([os.path.join(raw_dir, f) for f in data_files], key=os.path.getmtime)
-        
-        trades = TradeParserService.load_trades_from_file(latest_file)
-        analytics = AnalyticsService.calculate_all_analytics(trades)
-        
-        return {
-            'monthly_stats': analytics.monthly_stats
-        }
+        latest = _latest_file_or_404(latest)
+        return await _cached_json_response(latest, 'monthly-stats')
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,7 @@
 # app/api/v1/endpoints/auth.py
 
-from fastapi import APIRouter, HTTPException, Depends, status, Header
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 import logging
 
@@ -10,23 +11,46 @@ from app.schemas.auth import (
     VerifyEmailRequest,
     ForgotPasswordRequest, ResetPasswordRequest
 )
-from app.services.auth_service import AuthService
+from app.services.auth_service import AuthService, get_auth_service
 from app.utils.security import verify_token
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# auto_error=False: sin token se responde 401 (HTTPBearer por defecto responde 403)
+_bearer_scheme = HTTPBearer(auto_error=False)
+
 # ============================================================================
 # DEPENDENCY: Get current user from token
 # ============================================================================
 
-async def get_current_user(authorization: Optional[str] = Header(None)) -> UserResponse:
+def bearer_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_scheme)) -> str:
+    """
+    Dependency para extraer el token del header Authorization (Bearer).
+    
+    Raises:
+        HTTPException 401 si no hay header o no es de tipo Bearer
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No autorizado"
+        )
+    return credentials.credentials
+
+async def get_current_user(
+    token: str = Depends(bearer_token),
+    auth_service: AuthService = Depends(get_auth_service)
+) -> UserResponse:
     """
     Dependency para obtener el usuario actual desde el token.
     
+    AuthService.get_session cachea las sesiones por token, así que solo se
+    consulta MongoDB cuando el token no está en cache.
+    
     Args:
-        authorization: Header de Authorization (Bearer token)
+        token: Bearer token del header Authorization
         
     Returns:
         UserResponse del usuario autenticado
@@ -34,14 +58,6 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> UserR
     Raises:
         HTTPException 401 si el token es inválido
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autorizado"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    auth_service = AuthService()
     session = await auth_service.get_session(token)
     
     if not session:
@@ -57,7 +73,7 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> UserR
 # ============================================================================
 
 @router.post("/sign-up", response_model=dict, status_code=status.HTTP_201_CREATED)
-async def sign_up(user_data: UserCreate):
+async def sign_up(user_data: UserCreate, auth_service: AuthService = Depends(get_auth_service)):
     """
     Registrar un nuevo usuario.
     
@@ -69,8 +85,6 @@ async def sign_up(user_data: UserCreate):
     Returns:
         - Usuario creado y código de verificación (solo en dev)
     """
-    auth_service = AuthService()
-    
     try:
         user, verification_code = await auth_service.create_user(user_data)
         
@@ -96,7 +110,7 @@ async def sign_up(user_data: UserCreate):
         )
 
 @router.post("/sign-in", response_model=SessionResponse)
-async def sign_in(login_data: UserLogin):
+async def sign_in(login_data: UserLogin, auth_service: AuthService = Depends(get_auth_service)):
     """
     Autenticar un usuario (login).
     
@@ -106,8 +120,6 @@ async def sign_in(login_data: UserLogin):
     Returns:
         - Sesión con token de acceso y datos del usuario
     """
-    auth_service = AuthService()
-    
     # Autenticar usuario
     user = await auth_service.authenticate_user(login_data)
     
@@ -132,22 +144,16 @@ async def sign_in(login_data: UserLogin):
     return session
 
 @router.post("/sign-out", response_model=dict)
-async def sign_out(authorization: Optional[str] = Header(None)):
+async def sign_out(
+    token: str = Depends(bearer_token),
+    auth_service: AuthService = Depends(get_auth_service)
+):
     """
     Cerrar sesión (invalidar token).
     
     Requiere:
         - Authorization header con Bearer token
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No autorizado"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    auth_service = AuthService()
-    
     success = await auth_service.delete_session(token)
     
     if not success:
@@ -175,8 +181,6 @@ async def get_session(current_user: UserResponse = Depends(get_current_user)):
         - Datos del usuario y sesión activa
     """
     # El current_user ya viene validado por el Dependency
-    auth_service = AuthService()
-    
     # Obtener sesión completa (para incluir expires_at)
     # En producción, podrías cachear esto o incluirlo en el JWT
     return {
@@ -190,7 +194,7 @@ async def get_session(current_user: UserResponse = Depends(get_current_user)):
 # ============================================================================
 
 @router.post("/verify-email", response_model=dict)
-async def verify_email(verify_data: VerifyEmailRequest):
+async def verify_email(verify_data: VerifyEmailRequest, auth_service: AuthService = Depends(get_auth_service)):
     """
     Verificar el email de un usuario con código de 6 dígitos.
     
@@ -200,8 +204,6 @@ async def verify_email(verify_data: VerifyEmailRequest):
     Returns:
         - Confirmación de verificación
     """
-    auth_service = AuthService()
-    
     success = await auth_service.verify_email(verify_data)
     
     if not success:
@@ -218,7 +220,7 @@ async def verify_email(verify_data: VerifyEmailRequest):
     }
 
 @router.post("/resend-verification", response_model=dict)
-async def resend_verification(email: str):
+async def resend_verification(email: str, auth_service: AuthService = Depends(get_auth_service)):
     """
     Reenviar código de verificación.
     
@@ -227,8 +229,6 @@ async def resend_verification(email: str):
     Returns:
         - Confirmación de envío
     """
-    auth_service = AuthService()
-    
     verification_code = await auth_service.resend_verification_code(email)
     
     if not verification_code:
@@ -250,7 +250,7 @@ async def resend_verification(email: str):
 # ============================================================================
 
 @router.post("/forgot-password", response_model=dict)
-async def forgot_password(request: ForgotPasswordRequest):
+async def forgot_password(request: ForgotPasswordRequest, auth_service: AuthService = Depends(get_auth_service)):
     """
     Solicitar reset de contraseña.
     
@@ -259,8 +259,6 @@ async def forgot_password(request: ForgotPasswordRequest):
     Returns:
         - Confirmación de envío de email
     """
-    auth_service = AuthService()
-    
     await auth_service.forgot_password(request)
     
     # Por seguridad, siempre devolver éxito
@@ -272,7 +270,7 @@ async def forgot_password(request: ForgotPasswordRequest):
     }
 
 @router.post("/reset-password", response_model=dict)
-async def reset_password(request: ResetPasswordRequest):
+async def reset_password(request: ResetPasswordRequest, auth_service: AuthService = Depends(get_auth_service)):
     """
     Restablecer contraseña con token.
     
@@ -282,8 +280,6 @@ async def reset_password(request: ResetPasswordRequest):
     Returns:
         - Confirmación de cambio de contraseña
     """
-    auth_service = AuthService()
-    
     success = await auth_service.reset_password(request)
     
     if not success:
@@ -351,10 +347,16 @@ async def get_current_user_info(current_user: UserResponse = Depends(get_current
     return current_user
 
 @router.delete("/sessions/cleanup", response_model=dict)
-async def cleanup_expired_sessions(current_user: UserResponse = Depends(get_current_user)):
+async def cleanup_expired_sessions(
+    current_user: UserResponse = Depends(get_current_user),
+    auth_service: AuthService = Depends(get_auth_service)
+):
     """
     Limpiar sesiones expiradas (solo admin).
     
+    Normalmente no hace falta: el índice TTL de sessions.expires_at hace que
+    MongoDB las borre solo (con hasta ~60 s de retraso). Sirve para forzar la limpieza.
+    
     Requiere:
         - Authorization header con Bearer token
         - Role de admin
@@ -365,7 +367,6 @@ async def cleanup_expired_sessions(current_user: UserResponse = Depends(get_curr
             detail="Acceso denegado. Se requiere rol de administrador."
         )
     
-    auth_service = AuthService()
     deleted_count = await auth_service.cleanup_expired_sessions()
     
     logger.info(f"Sesiones expiradas limpiadas: {deleted_count}")
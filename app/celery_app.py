@@ -0,0 +1,40 @@
+# app/celery_app.py
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Broker de Celery (ej: redis://localhost:6379/0, amqp://guest@localhost//).
+# Vacío = sin cola: los emails se envían por SMTP desde un thread del proceso de la API
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "")
+
+# ============================================================================
+# CELERY (OPCIONAL)
+# ============================================================================
+# Worker de emails (SMTP es casi todo espera de red: gevent con mucha concurrencia):
+#   celery -A app.celery_app worker -Q mail -P gevent -c 200 --prefetch-multiplier=1 --max-tasks-per-child=1000
+# Con escalado: --autoscale=200,20 en vez de -c 200.
+# Las conexiones SMTP abiertas por worker siguen limitadas a SMTP_POOL_SIZE: el resto
+# de greenlets espera una libre en vez de abrir sesiones que el proveedor bloquearía.
+# Broker Redis (redis://...) con el cliente de requirements.txt; gevent también está ahí.
+# Trabajo de CPU futuro: cola por defecto con prefork, -c igual al número de CPUs
+
+celery_app = None
+
+if CELERY_BROKER_URL:
+    from celery import Celery
+
+    celery_app = Celery(
+        "tradingbot",
+        broker=CELERY_BROKER_URL,
+        include=["app.utils.email"]
+    )
+    celery_app.conf.task_routes = {
+        "app.utils.email.*": {"queue": "mail"}
+    }
+    # Un mensaje por worker a la vez: un proveedor lento no retiene tareas ya reservadas.
+    # El ack tras ejecutar hace que una tarea de un worker caído se reintente (puede duplicar un email)
+    celery_app.conf.worker_prefetch_multiplier = 1
+    celery_app.conf.task_acks_late = True
+    logger.info("📨 Celery configurado: los emails se envían desde la cola 'mail'")
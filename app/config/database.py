@@ -1,6 +1,7 @@
 # app/config/database.py
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from typing import Optional
 import os
 import logging
@@ -11,6 +12,13 @@ logger = logging.getLogger(__name__)
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "trading_bot_db")
 
+# Pool de conexiones (un único cliente por proceso)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+# Compresión del protocolo: pymongo ignora (con warning) las que no tengan librería instalada
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "zstd,zlib")
+
 class MongoDB:
     """Singleton para conexión a MongoDB"""
     
@@ -20,8 +28,19 @@ class MongoDB:
     @classmethod
     async def connect_db(cls):
         """Conectar a MongoDB"""
+        if cls.client is not None:
+            return
+        
         try:
-            cls.client = AsyncIOMotorClient(MONGODB_URL)
+            cls.client = AsyncIOMotorClient(
+                MONGODB_URL,
+                maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                minPoolSize=MONGODB_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                retryWrites=True,
+                compressors=MONGODB_COMPRESSORS,
+                uuidRepresentation='standard'
+            )
             cls.database = cls.client[DATABASE_NAME]
             
             # Verificar conexión
@@ -33,6 +52,8 @@ class MongoDB:
             
         except Exception as e:
             logger.error(f"❌ Error conectando a MongoDB: {str(e)}")
+            cls.client = None
+            cls.database = None
             raise
     
     @classmethod
@@ -40,6 +61,8 @@ class MongoDB:
         """Cerrar conexión a MongoDB"""
         if cls.client:
             cls.client.close()
+            cls.client = None
+            cls.database = None
             logger.info("MongoDB desconectado")
     
     @classmethod
@@ -53,11 +76,12 @@ class MongoDB:
             # Índices para sessions
             await cls.database.sessions.create_index("user_id")
             await cls.database.sessions.create_index("token", unique=True)
-            await cls.database.sessions.create_index("expires_at")
+            await cls._create_ttl_index(cls.database.sessions, "expires_at")
             
-            # Índices para verifications
-            await cls.database.verifications.create_index("identifier")
-            await cls.database.verifications.create_index("expires_at")
+            # Índices para verifications (identifier + code: el filtro de verify_email;
+            # el prefijo identifier sirve también para borrar/reemplazar las anteriores)
+            await cls.database.verifications.create_index([("identifier", 1), ("code", 1)])
+            await cls._create_ttl_index(cls.database.verifications, "expires_at")
             
             # Índices para accounts (OAuth)
             await cls.database.accounts.create_index([("provider", 1), ("provider_id", 1)], unique=True)
@@ -68,6 +92,24 @@ class MongoDB:
         except Exception as e:
             logger.warning(f"⚠️ Error creando índices: {str(e)}")
     
+    @classmethod
+    async def _create_ttl_index(cls, collection, field: str):
+        """
+        Crear un índice TTL (expireAfterSeconds=0): MongoDB borra los documentos
+        en segundo plano cuando pasa la fecha guardada en `field`.
+        
+        Si ya existía un índice normal sobre el campo (IndexOptionsConflict /
+        IndexKeySpecsConflict), se elimina y se vuelve a crear como TTL.
+        """
+        try:
+            await collection.create_index(field, expireAfterSeconds=0)
+        except OperationFailure as e:
+            if e.code not in (85, 86):
+                raise
+            logger.info(f"🔁 Convirtiendo {collection.name}.{field} en índice TTL")
+            await collection.drop_index(f"{field}_1")
+            await collection.create_index(field, expireAfterSeconds=0)
+    
     @classmethod
     def get_database(cls):
         """Obtener instancia de la base de datos"""
@@ -1,7 +1,9 @@
 # app/main.py
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 
 # Importar routers
@@ -9,6 +11,11 @@ from app.api.v1.endpoints import analytics, auth
 
 # Importar configuración de MongoDB
 from app.config.database import MongoDB
+from app.services.auth_service import get_auth_service
+
+# Watcher del último archivo de operaciones
+from app.services import latest_csv
+from app.services.cache import get_latest_file, precompute
 
 # Configurar logging
 logging.basicConfig(
@@ -24,7 +31,8 @@ app = FastAPI(
     description="API profesional para análisis de trading y gestión de usuarios con autenticación completa",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse  # JSON con orjson en todos los endpoints
 )
 
 # Configurar CORS
@@ -49,8 +57,35 @@ async def shutdown_db_client():
     """Cerrar conexión a MongoDB al apagar"""
     logger.info("🔌 Cerrando conexión a MongoDB...")
     await MongoDB.close_db()
+    # El AuthService compartido guarda la referencia a la base de datos cerrada
+    get_auth_service.cache_clear()
     logger.info("✅ MongoDB desconectado")
 
+@app.on_event("startup")
+async def startup_latest_file_watcher():
+    """Vigilar data/raw para mantener el puntero al archivo más reciente"""
+    latest_csv.start_watcher()
+
+@app.on_event("shutdown")
+async def shutdown_latest_file_watcher():
+    """Detener el watcher de data/raw"""
+    await latest_csv.stop_watcher()
+
+@app.on_event("startup")
+async def startup_warm_up():
+    """
+    Adelantar al arranque el trabajo que si no pagaría el primer request.
+    
+    Los validadores/serializers de pydantic ya se construyen al importar los
+    modelos; lo que queda diferido es el schema OpenAPI y el primer cálculo
+    de analytics del archivo más reciente.
+    """
+    app.openapi()
+    latest = get_latest_file()
+    if latest is not None:
+        # En segundo plano: el servidor acepta requests mientras se calcula
+        asyncio.get_running_loop().run_in_executor(None, precompute, latest)
+
 # Incluir routers
 app.include_router(
     analytics.router,
@@ -85,12 +120,23 @@ async def health_check():
     }
 
 if __name__ == "__main__":
+    import os
+    import importlib.util
     import uvicorn
+    
+    # reload no es compatible con varios workers: RELOAD=true para desarrollo
+    reload = os.getenv("RELOAD", "false").lower() == "true"
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    
     logger.info("🚀 Iniciando Trading Portfolio Analytics API...")
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=reload,
+        workers=workers,
+        # uvloop no existe en Windows: ahí se queda el loop asyncio estándar
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools",
         log_level="info"
     )
@@ -1,11 +1,71 @@
 # app/services/analytics_service.py
 
-import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple
-from datetime import datetime, timedelta
+import logging
+from operator import attrgetter
+from typing import List, Tuple
 from app.schemas.trade import Trade
 from app.schemas.analytics import Analytics, DailyStats, MonthlyStats
+from app.services.trade_table import TradeTable, NS_PER_HOUR
+from app.services.trade_parser_service import TradeParserService
+from app.services.kernels import (
+    equity_and_drawdown, hourly_stats, best_bucket,
+    group_stats, longest_runs, sorted_codes, bin_counts
+)
+
+logger = logging.getLogger(__name__)
+
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+# Intervalos (a, b] de las distribuciones; las etiquetas son las de pd.cut(include_lowest=True)
+PROFIT_BINS = np.array([-np.inf, -1000, -500, -100, 0, 100, 500, 1000, np.inf])
+PROFIT_BIN_LABELS = [
+    '(-inf, -1000.0]', '(-1000.0, -500.0]', '(-500.0, -100.0]', '(-100.0, 0.0]',
+    '(0.0, 100.0]', '(100.0, 500.0]', '(500.0, 1000.0]', '(1000.0, inf]'
+]
+DURATION_BINS = np.array([0, 30, 60, 120, 240, 480, 1440, np.inf])
+DURATION_BIN_LABELS = [
+    '(-0.001, 30.0]', '(30.0, 60.0]', '(60.0, 120.0]', '(120.0, 240.0]',
+    '(240.0, 480.0]', '(480.0, 1440.0]', '(1440.0, inf]'
+]
+
+# Campos de Trade que necesita _calculate (en el orden en que se desempaquetan)
+_TRADE_FIELDS = attrgetter('open_time', 'symbol', 'volume', 'open_price', 'profit_usd', 'duration')
+
+
+def _isoformat(open_time_ns: np.ndarray) -> np.ndarray:
+    """
+    Formatear fechas como datetime.isoformat() en bloque (np.datetime_as_string).
+    
+    Igual que isoformat, los microsegundos solo aparecen si no son cero.
+    """
+    times = open_time_ns.view('datetime64[ns]').astype('datetime64[us]')
+    dates = np.datetime_as_string(times, unit='s')
+    has_fraction = times.view(np.int64) % 1_000_000 != 0
+    if has_fraction.any():
+        dates = dates.astype(object)
+        dates[has_fraction] = np.datetime_as_string(times[has_fraction], unit='us')
+    return dates
+
+
+def _empty_analytics() -> Analytics:
+    """Analytics de una cuenta sin operaciones (todo a cero, distribuciones vacías)"""
+    return Analytics.model_construct(
+        total_trades=0, winning_trades=0, losing_trades=0, break_even=0,
+        total_profit=0.0, total_profit_pct=0.0, average_profit=0.0,
+        win_rate=0.0, profit_factor=0.0, payoff_ratio=0.0,
+        max_drawdown=0.0, max_drawdown_pct=0.0, current_drawdown=0.0,
+        longest_win_streak=0, longest_loss_streak=0, current_streak=0,
+        symbol_stats={},
+        best_day="", best_day_profit=0.0, worst_day="", worst_day_profit=0.0,
+        best_hour=0, best_hour_profit=0.0,
+        equity_curve=[], equity_dates=[],
+        daily_stats=[], monthly_stats=[],
+        period_start="", period_end="", total_days=0,
+        profit_distribution=dict.fromkeys(PROFIT_BIN_LABELS, 0),
+        duration_distribution=dict.fromkeys(DURATION_BIN_LABELS, 0)
+    )
+
 
 class AnalyticsService:
     """Calcular KPIs y estadísticas de operaciones"""
@@ -14,129 +74,226 @@ class AnalyticsService:
     def calculate_all_analytics(trades: List[Trade]) -> Analytics:
         """Calcular todas las métricas analíticas"""
         
-        df = pd.DataFrame([t.model_dump() for t in trades])
-        df['open_time'] = pd.to_datetime(df['open_time'])
-        df['close_time'] = pd.to_datetime(df['close_time'])
-        df = df.sort_values('open_time')
+        # Leer solo los campos que usa el cálculo, en una pasada (sin model_dump por operación)
+        rows = list(map(_TRADE_FIELDS, trades))
+        open_time, symbol, volume, open_price, profit, duration = zip(*rows) if rows else ((),) * 6
+        symbol_categories, symbol_codes = np.unique(np.array(symbol, dtype=object), return_inverse=True)
+        return AnalyticsService._calculate(
+            open_time_ns=np.array(open_time, dtype='datetime64[ns]').view(np.int64),
+            symbol_codes=symbol_codes,
+            symbol_categories=symbol_categories,
+            volume=np.array(volume, dtype=np.float64),
+            open_price=np.array(open_price, dtype=np.float64),
+            profit=np.array(profit, dtype=np.float64),
+            duration=np.array(duration, dtype=np.int64)
+        )
+    
+    @staticmethod
+    def validate_and_summarize(table: TradeTable) -> Analytics:
+        """
+        Validar y calcular todas las métricas directamente sobre las columnas de la tabla.
+        
+        Sustituye a validate_trade_data + calculate_all_analytics: no se construyen
+        modelos Trade ni se vuelve a recorrer la lista de operaciones.
+        
+        Raises:
+            ValueError: Si no hay operaciones o hay valores no finitos
+        """
+        if len(table) == 0:
+            raise ValueError("No hay operaciones para analizar")
+        if not np.isfinite(table.profit_usd).all():
+            raise ValueError("Hay operaciones con profit no numérico")
+        logger.info(f"✅ Validadas {len(table)} operaciones")
+        
+        return AnalyticsService._calculate(
+            open_time_ns=table.open_time_ns,
+            symbol_codes=table.symbol_codes,
+            symbol_categories=table.symbol_categories,
+            volume=table.volume,
+            open_price=table.open_price,
+            profit=table.profit_usd,
+            duration=table.duration
+        )
+    
+    @staticmethod
+    def load_validate_and_summarize(file_path: str) -> Tuple[TradeTable, Analytics]:
+        """
+        Cargar el archivo por columnas, validarlo y calcular analytics en una sola pasada.
+        
+        Returns:
+            Tupla (TradeTable, Analytics)
+        """
+        table = TradeParserService.load_trades_as_table(file_path)
+        return table, AnalyticsService.validate_and_summarize(table)
+    
+    @staticmethod
+    def _calculate(
+        open_time_ns: np.ndarray,
+        symbol_codes: np.ndarray,
+        symbol_categories: np.ndarray,
+        volume: np.ndarray,
+        open_price: np.ndarray,
+        profit: np.ndarray,
+        duration: np.ndarray
+    ) -> Analytics:
+        """
+        Calcular las métricas sobre arrays NumPy (una posición por operación).
+        
+        Las agrupaciones (día, mes, hora, símbolo) usan códigos enteros + np.bincount,
+        sin construir DataFrames ni objetos date.
+        """
+        
+        # Sin operaciones no hay nada que agregar
+        if len(profit) == 0:
+            return _empty_analytics()
+        
+        # Ordenar cronológicamente (mismo quicksort sobre datetime64 que DataFrame.sort_values,
+        # así las operaciones con la misma hora de apertura quedan en el mismo orden)
+        order = np.argsort(open_time_ns.view('datetime64[ns]'), kind='quicksort')
+        open_time_ns = open_time_ns[order]
+        symbol_codes = symbol_codes[order]
+        profit = profit[order]
+        duration = duration[order]
         
         # CÁLCULOS GENERALES
-        total_trades = len(df)
-        winning = len(df[df['profit_usd'] > 0])
-        losing = len(df[df['profit_usd'] < 0])
-        break_even = len(df[df['profit_usd'] == 0])
+        # Máscaras de ganadoras/perdedoras una sola vez: las reutilizan todas las agregaciones
+        is_win = profit > 0
+        is_loss = profit < 0
+        total_trades = len(profit)
+        winning = int(is_win.sum())
+        losing = int(is_loss.sum())
+        break_even = total_trades - winning - losing
         
-        total_profit = df['profit_usd'].sum()
-        win_rate = (winning / total_trades * 100) if total_trades > 0 else 0
+        total_profit = profit.sum()
+        win_rate = winning / total_trades * 100
         
         # PROFIT FACTOR
-        gains = df[df['profit_usd'] > 0]['profit_usd'].sum()
-        losses = abs(df[df['profit_usd'] < 0]['profit_usd'].sum())
+        # Una sola suma por signo; los promedios se derivan de ellas y de los conteos
+        gains = profit.sum(where=is_win)
+        losses = abs(profit.sum(where=is_loss))
         profit_factor = (gains / losses) if losses > 0 else 0
         
         # PAYOFF RATIO
-        avg_win = df[df['profit_usd'] > 0]['profit_usd'].mean() if winning > 0 else 0
-        avg_loss = abs(df[df['profit_usd'] < 0]['profit_usd'].mean()) if losing > 0 else 1
+        avg_win = gains / winning if winning > 0 else 0
+        avg_loss = losses / losing if losing > 0 else 1
         payoff_ratio = avg_win / avg_loss if avg_loss > 0 else 0
         
         # DRAWDOWN
-        cumsum = df['profit_usd'].cumsum()
-        running_max = cumsum.cummax()
-        drawdown = cumsum - running_max
+        cumsum, drawdown = equity_and_drawdown(profit)
         max_drawdown = drawdown.min()
-        max_drawdown_pct = (max_drawdown / running_max.max() * 100) if running_max.max() > 0 else 0
+        # El máximo del pico acumulado es el máximo de la propia curva
+        peak = cumsum.max()
+        max_drawdown_pct = (max_drawdown / peak * 100) if peak > 0 else 0
         
         # RACHAS
-        df['sign'] = np.sign(df['profit_usd'])
-        df['streak_group'] = (df['sign'] != df['sign'].shift()).cumsum()
-        streaks = df.groupby('streak_group').size()
-        
-        win_streaks = streaks[df.groupby('streak_group')['profit_usd'].sum() > 0]
-        loss_streaks = streaks[df.groupby('streak_group')['profit_usd'].sum() < 0]
-        
-        longest_win = int(win_streaks.max()) if len(win_streaks) > 0 else 0
-        longest_loss = int(loss_streaks.max()) if len(loss_streaks) > 0 else 0
+        # Signo int8 reutilizando las máscaras ya calculadas (sin otra pasada de np.sign)
+        sign = is_win.view(np.int8) - is_loss.view(np.int8)
+        longest_win, longest_loss = longest_runs(sign)
         
         # MEJOR/PEOR DÍA
-        daily = df.groupby(df['open_time'].dt.date)['profit_usd'].sum()
-        best_day = str(daily.idxmax()) if len(daily) > 0 else ""
-        best_day_profit = float(daily.max()) if len(daily) > 0 else 0.0
-        worst_day = str(daily.idxmin()) if len(daily) > 0 else ""
-        worst_day_profit = float(daily.min()) if len(daily) > 0 else 0.0
+        # Una sola agregación por día (la reutilizan las estadísticas diarias y mensuales)
+        # Los datos ya están ordenados por fecha: los códigos de día salen de los cambios de valor
+        days, day_codes = sorted_codes(open_time_ns // NS_PER_DAY)
+        day_trades, daily, day_wins = group_stats(day_codes, len(days), profit, is_win)
+        day_max_loss = np.full(len(days), np.inf)
+        np.minimum.at(day_max_loss, day_codes, profit)
+        day_labels = days.astype('datetime64[D]').astype(str)
+        
+        best_day = str(day_labels[daily.argmax()])
+        best_day_profit = float(daily.max())
+        worst_day = str(day_labels[daily.argmin()])
+        worst_day_profit = float(daily.min())
         
         # MEJOR HORA
-        df['hour'] = df['open_time'].dt.hour
-        hourly = df.groupby('hour')['profit_usd'].mean()
-        best_hour = int(hourly.idxmax()) if len(hourly) > 0 else 0
-        best_hour_profit = float(hourly.max()) if len(hourly) > 0 else 0.0
-        
-        # ESTADÍSTICAS POR SÍMBOLO
-        symbol_stats = {}
-        for symbol in df['symbol'].unique():
-            symbol_df = df[df['symbol'] == symbol]
-            symbol_stats[symbol] = {
-                'trades': len(symbol_df),
-                'profit': float(symbol_df['profit_usd'].sum()),
-                'win_rate': float((len(symbol_df[symbol_df['profit_usd'] > 0]) / len(symbol_df) * 100) if len(symbol_df) > 0 else 0),
-                'avg_profit': float(symbol_df['profit_usd'].mean())
-            }
+        hour_sums, hour_counts = hourly_stats((open_time_ns // NS_PER_HOUR) % 24, profit)
+        best_hour = best_bucket(hour_sums, hour_counts)
+        best_hour_profit = float(hour_sums[best_hour] / hour_counts[best_hour])
+        
+        # ESTADÍSTICAS POR SÍMBOLO (en orden de primera aparición)
+        # Una pasada de bincount por métrica y otra para la primera aparición (sin ordenar)
+        n_symbols = len(symbol_categories)
+        symbol_trades, symbol_profit, symbol_wins = group_stats(symbol_codes, n_symbols, profit, is_win)
+        first_seen = np.full(n_symbols, total_trades)
+        np.minimum.at(first_seen, symbol_codes, np.arange(total_trades))
+        present = np.flatnonzero(symbol_trades > 0)
+        present = present[np.argsort(first_seen[present])]
+        
+        trades_by_symbol = symbol_trades[present]
+        symbol_stats = {
+            symbol: {'trades': trades, 'profit': total, 'win_rate': rate, 'avg_profit': avg}
+            for symbol, trades, total, rate, avg in zip(
+                symbol_categories[present].tolist(),
+                trades_by_symbol.tolist(),
+                symbol_profit[present].tolist(),
+                (symbol_wins[present] / trades_by_symbol * 100).tolist(),
+                (symbol_profit[present] / trades_by_symbol).tolist()
+            )
+        }
         
         # CURVA DE CAPITAL
-        equity_curve = [float(x) for x in cumsum.values]
-        equity_dates = [d.isoformat() for d in df['open_time']]
+        equity_curve = cumsum.tolist()
+        equity_dates = _isoformat(open_time_ns).tolist()
         
         # ESTADÍSTICAS DIARIAS
-        daily_stats = []
-        for date, group in df.groupby(df['open_time'].dt.date):
-            daily_stats.append(DailyStats(
+        # model_construct: los valores ya son int/float/str nativos, no hace falta validar
+        daily_stats = [
+            DailyStats.model_construct(
                 date=str(date),
-                trades=len(group),
-                profit=float(group['profit_usd'].sum()),
-                win_rate=float((len(group[group['profit_usd'] > 0]) / len(group) * 100) if len(group) > 0 else 0),
-                max_loss=float(group['profit_usd'].min())
-            ))
+                trades=int(trades),
+                profit=float(day_profit),
+                win_rate=float(int(wins) / int(trades) * 100),
+                max_loss=float(max_loss)
+            )
+            for date, trades, day_profit, wins, max_loss
+            in zip(day_labels, day_trades, daily, day_wins, day_max_loss)
+        ]
         
         # ESTADÍSTICAS MENSUALES
+        day_months = days.astype('datetime64[D]').astype('datetime64[M]')
+        months, month_of_day = sorted_codes(day_months)
+        month_trades, month_profit, month_wins = group_stats(month_of_day[day_codes], len(months), profit, is_win)
+        
+        # Mejor/peor día de cada mes sobre el profit diario ya agregado (días consecutivos por mes)
+        month_starts = np.searchsorted(month_of_day, np.arange(len(months)), side='left')
+        month_ends = np.r_[month_starts[1:], len(days)]
         monthly_stats = []
-        df['month'] = df['open_time'].dt.to_period('M')
-        for month, group in df.groupby('month'):
-            group_by_date = group.groupby(group['open_time'].dt.date)['profit_usd'].sum()
-            monthly_stats.append(MonthlyStats(
-                month=str(month),
-                trades=len(group),
-                profit=float(group['profit_usd'].sum()),
-                win_rate=float((len(group[group['profit_usd'] > 0]) / len(group) * 100) if len(group) > 0 else 0),
-                best_day=str(group_by_date.idxmax()) if len(group_by_date) > 0 else "",
-                worst_day=str(group_by_date.idxmin()) if len(group_by_date) > 0 else ""
+        for m, (start, end) in enumerate(zip(month_starts, month_ends)):
+            month_daily = daily[start:end]
+            monthly_stats.append(MonthlyStats.model_construct(
+                month=str(months[m]),
+                trades=int(month_trades[m]),
+                profit=float(month_profit[m]),
+                win_rate=float(int(month_wins[m]) / int(month_trades[m]) * 100),
+                best_day=str(day_labels[start + month_daily.argmax()]),
+                worst_day=str(day_labels[start + month_daily.argmin()])
             ))
         
         # DISTRIBUCIÓN DE GANANCIAS
-        profit_bins = [-float('inf'), -1000, -500, -100, 0, 100, 500, 1000, float('inf')]
-        profit_distribution = df['profit_usd'].value_counts(bins=profit_bins, sort=False).to_dict()
-        profit_distribution = {str(k): int(v) for k, v in profit_distribution.items()}
+        profit_distribution = dict(zip(PROFIT_BIN_LABELS, bin_counts(profit, PROFIT_BINS).tolist()))
         
         # DISTRIBUCIÓN DE DURACIONES
-        duration_bins = [0, 30, 60, 120, 240, 480, 1440, float('inf')]
-        duration_distribution = df['duration'].value_counts(bins=duration_bins, sort=False).to_dict()
-        duration_distribution = {str(k): int(v) for k, v in duration_distribution.items()}
+        duration_distribution = dict(zip(DURATION_BIN_LABELS, bin_counts(duration, DURATION_BINS).tolist()))
         
         # CONSTRUIR OBJETO ANALYTICS
-        analytics = Analytics(
+        # model_construct: todos los valores se calcularon arriba como escalares nativos
+        first = order[0]
+        analytics = Analytics.model_construct(
             total_trades=total_trades,
             winning_trades=winning,
             losing_trades=losing,
             break_even=break_even,
             total_profit=float(total_profit),
-            total_profit_pct=float((total_profit / abs(df['open_price'].iloc[0] * df['volume'].iloc[0] * 100000)) * 100) if len(df) > 0 else 0,
-            average_profit=float(df['profit_usd'].mean()),
+            total_profit_pct=float((total_profit / abs(open_price[first] * volume[first] * 100000)) * 100),
+            average_profit=float(profit.mean()),
             win_rate=float(win_rate),
             profit_factor=float(profit_factor),
             payoff_ratio=float(payoff_ratio),
             max_drawdown=float(max_drawdown),
             max_drawdown_pct=float(max_drawdown_pct),
-            current_drawdown=float(drawdown.iloc[-1]) if len(drawdown) > 0 else 0,
+            current_drawdown=float(drawdown[-1]),
             longest_win_streak=longest_win,
             longest_loss_streak=longest_loss,
-            current_streak=int(df['sign'].iloc[-1] if len(df) > 0 else 0),
+            current_streak=int(sign[-1]),
             symbol_stats=symbol_stats,
             best_day=best_day,
             best_day_profit=best_day_profit,
@@ -148,9 +305,9 @@ class AnalyticsService:
             equity_dates=equity_dates,
             daily_stats=daily_stats,
             monthly_stats=monthly_stats,
-            period_start=str(df['open_time'].min()) if len(df) > 0 else "",
-            period_end=str(df['open_time'].max()) if len(df) > 0 else "",
-            total_days=int((df['open_time'].max() - df['open_time'].min()).days) if len(df) > 0 else 0,
+            period_start=equity_dates[0].replace('T', ' '),
+            period_end=equity_dates[-1].replace('T', ' '),
+            total_days=int((open_time_ns[-1] - open_time_ns[0]) // NS_PER_DAY),
             profit_distribution=profit_distribution,
             duration_distribution=duration_distribution
         )
@@ -1,8 +1,12 @@
 # app/services/auth_service.py
 
 from typing import Optional, Tuple
+from functools import lru_cache
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
+from cachetools import TTLCache
+import asyncio
 import logging
 
 from app.schemas.auth import (
@@ -22,12 +26,54 @@ from app.utils.security import (
 from app.utils.email import (
     send_verification_email,
     send_password_reset_email,
-    send_welcome_email
+    send_welcome_email,
+    send_in_background
 )
 from app.config.database import get_db
 
 logger = logging.getLogger(__name__)
 
+# Campos de users que necesita UserResponse (nunca se lee password_hash para las sesiones)
+USER_RESPONSE_PROJECTION = {
+    field: True for field in ("email", "name", "image", "role", "email_verified", "created_at")
+}
+
+# Cache en memoria token -> SessionResponse para no leer el usuario de MongoDB en cada request.
+# Es por proceso (un cache por worker): un sign-out o reset en otro worker no lo vacía, así
+# que en cada acierto se confirma en MongoDB que la sesión sigue existiendo (ver get_session)
+SESSION_CACHE_TTL = 60  # segundos
+_SESSION_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=SESSION_CACHE_TTL)
+# Índice inverso user_id -> tokens cacheados (para invalidar todas las sesiones de un usuario)
+_USER_TOKENS: TTLCache = TTLCache(maxsize=10_000, ttl=SESSION_CACHE_TTL)
+# Tokens y usuarios invalidados hace menos de SESSION_CACHE_TTL: una lectura de MongoDB
+# que estaba en curso durante la invalidación no puede volver a cachear la sesión revocada
+_REVOKED_TOKENS: TTLCache = TTLCache(maxsize=10_000, ttl=SESSION_CACHE_TTL)
+_REVOKED_USERS: TTLCache = TTLCache(maxsize=10_000, ttl=SESSION_CACHE_TTL)
+
+
+def _cache_session(session: SessionResponse):
+    """Guardar una sesión válida en el cache y registrar el token en el índice del usuario"""
+    if session.token in _REVOKED_TOKENS or session.user.id in _REVOKED_USERS:
+        return
+    _SESSION_CACHE[session.token] = session
+    tokens = _USER_TOKENS.get(session.user.id) or set()
+    tokens.add(session.token)
+    _USER_TOKENS[session.user.id] = tokens
+
+
+def _invalidate_token(token: str):
+    """Sacar un token del cache (sign-out)"""
+    _REVOKED_TOKENS[token] = True
+    _SESSION_CACHE.pop(token, None)
+
+
+def _invalidate_user(user_id: str):
+    """Sacar del cache todos los tokens de un usuario (ej: después de cambiar el password)"""
+    _REVOKED_USERS[user_id] = True
+    for token in _USER_TOKENS.pop(user_id, ()):
+        _SESSION_CACHE.pop(token, None)
+
+
 class AuthService:
     """Servicio de autenticación y gestión de usuarios"""
     
@@ -56,8 +102,8 @@ class AuthService:
         if existing_user:
             raise ValueError("El email ya está registrado")
         
-        # Hash del password
-        password_hash = hash_password(user_data.password)
+        # Hash del password (bcrypt es CPU: en un thread para no bloquear el event loop)
+        password_hash = await asyncio.to_thread(hash_password, user_data.password)
         
         # Crear documento de usuario
         user_doc = {
@@ -71,19 +117,16 @@ class AuthService:
             "updated_at": None
         }
         
-        # Insertar en MongoDB
+        # Insertar en MongoDB; el código de verificación se crea solo si el insert
+        # funcionó (un registro duplicado no debe pisar el código pendiente del usuario)
         result = await self.db.users.insert_one(user_doc)
         user_doc["_id"] = str(result.inserted_id)
         
-        # Crear código de verificación
         verification_code = generate_verification_code()
         await self._create_verification(user_data.email, verification_code)
         
-        # Enviar email de verificación
-        try:
-            send_verification_email(user_data.email, verification_code)
-        except Exception as e:
-            logger.error(f"Error enviando email de verificación: {str(e)}")
+        # Enviar email de verificación (en segundo plano, sin esperar al SMTP)
+        send_in_background(send_verification_email, user_data.email, verification_code)
         
         # Convertir a UserResponse
         user_response = UserResponse(
@@ -114,8 +157,8 @@ class AuthService:
         if not user_doc:
             return None
         
-        # Verificar password
-        if not verify_password(login_data.password, user_doc["password_hash"]):
+        # Verificar password (bcrypt en un thread, fuera del event loop)
+        if not await asyncio.to_thread(verify_password, login_data.password, user_doc["password_hash"]):
             return None
         
         # Convertir a UserInDB
@@ -146,6 +189,30 @@ class AuthService:
             logger.error(f"Error obteniendo usuario: {str(e)}")
             return None
     
+    async def _get_user_response(self, user_id: str) -> Optional[UserResponse]:
+        """
+        Obtener solo los campos públicos de un usuario (sin password_hash).
+        
+        Args:
+            user_id: ID del usuario
+            
+        Returns:
+            UserResponse si existe, None si no
+        """
+        try:
+            user_doc = await self.db.users.find_one(
+                {"_id": ObjectId(user_id)},
+                projection=USER_RESPONSE_PROJECTION
+            )
+            if not user_doc:
+                return None
+            
+            user_doc["_id"] = str(user_doc["_id"])
+            return UserResponse(**user_doc)
+        except Exception as e:
+            logger.error(f"Error obteniendo usuario: {str(e)}")
+            return None
+    
     async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
         """
         Obtener un usuario por email.
@@ -195,7 +262,7 @@ class AuthService:
             True si se actualizó, False si no
         """
         try:
-            password_hash = hash_password(new_password)
+            password_hash = await asyncio.to_thread(hash_password, new_password)
             result = await self.db.users.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": {"password_hash": password_hash, "updated_at": datetime.utcnow()}}
@@ -261,19 +328,35 @@ class AuthService:
         """
         Obtener una sesión por token.
         
+        Las sesiones válidas se cachean durante SESSION_CACHE_TTL segundos; en
+        un acierto solo se comprueba (por el índice de token) que la sesión no
+        se haya borrado, así un sign-out en cualquier worker se aplica al instante.
+        
         Args:
             token: JWT token
             
         Returns:
             SessionResponse si la sesión es válida, None si no
         """
+        cached = _SESSION_CACHE.get(token)
+        if cached is not None and cached.expires_at > datetime.utcnow():
+            if await self.db.sessions.find_one({"token": token}, projection={"_id": True}):
+                return cached
+            # Revocada en otro worker (sign-out, reset de password)
+            _invalidate_token(token)
+            return None
+        
         # Verificar token
         token_payload = verify_token(token)
         if not token_payload:
             return None
         
-        # Buscar sesión en MongoDB
-        session_doc = await self.db.sessions.find_one({"token": token})
+        # Buscar sesión y usuario a la vez (el token ya trae el user_id);
+        # de la sesión solo se necesita expires_at
+        session_doc, user_response = await asyncio.gather(
+            self.db.sessions.find_one({"token": token}, projection={"_id": False, "expires_at": True}),
+            self._get_user_response(token_payload.sub)
+        )
         if not session_doc:
             return None
         
@@ -282,27 +365,16 @@ class AuthService:
             await self.delete_session(token)
             return None
         
-        # Obtener usuario
-        user = await self.get_user_by_id(token_payload.sub)
-        if not user:
+        if not user_response:
             return None
         
-        # Convert user to UserResponse
-        user_response = UserResponse(
-            _id=user.id,
-            email=user.email,
-            name=user.name,
-            image=user.image,
-            role=user.role,
-            email_verified=user.email_verified,
-            created_at=user.created_at
-        )
-        
-        return SessionResponse(
+        session = SessionResponse(
             user=user_response,
             token=token,
             expires_at=session_doc["expires_at"]
         )
+        _cache_session(session)
+        return session
     
     async def delete_session(self, token: str) -> bool:
         """
@@ -314,6 +386,7 @@ class AuthService:
         Returns:
             True si se eliminó, False si no
         """
+        _invalidate_token(token)
         result = await self.db.sessions.delete_one({"token": token})
         if result.deleted_count > 0:
             logger.info("Sesión eliminada")
@@ -349,19 +422,25 @@ class AuthService:
         Returns:
             VerificationInDB
         """
-        # Eliminar verificaciones anteriores
+        # Borrar todas las verificaciones anteriores: identifier no es único en la colección,
+        # así que puede haber duplicados (reenvíos concurrentes, datos antiguos)
         await self.db.verifications.delete_many({"identifier": identifier})
         
-        # Crear nueva verificación (expira en 15 minutos)
-        verification_doc = {
-            "identifier": identifier,
-            "code": code,
-            "expires_at": datetime.utcnow() + timedelta(minutes=15),
-            "created_at": datetime.utcnow()
-        }
-        
-        result = await self.db.verifications.insert_one(verification_doc)
-        verification_doc["_id"] = str(result.inserted_id)
+        # Crear la nueva (expira en 15 minutos); con upsert, si un reenvío concurrente ya
+        # insertó la suya entre medias, se reemplaza en vez de dejar dos códigos válidos
+        now = datetime.utcnow()
+        verification_doc = await self.db.verifications.find_one_and_replace(
+            {"identifier": identifier},
+            {
+                "identifier": identifier,
+                "code": code,
+                "expires_at": now + timedelta(minutes=15),
+                "created_at": now
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        verification_doc["_id"] = str(verification_doc["_id"])
         
         return VerificationInDB(**verification_doc)
     
@@ -375,37 +454,29 @@ class AuthService:
         Returns:
             True si se verificó correctamente, False si no
         """
-        # Buscar verificación
-        verification = await self.db.verifications.find_one({
+        # Consumir la verificación solo si el código es válido y no expiró (una sola operación)
+        verification = await self.db.verifications.find_one_and_delete({
             "identifier": verify_data.email,
-            "code": verify_data.code
+            "code": verify_data.code,
+            "expires_at": {"$gte": datetime.utcnow()}
         })
         
         if not verification:
-            logger.warning(f"Código de verificación inválido para: {verify_data.email}")
+            logger.warning(f"Código de verificación inválido o expirado para: {verify_data.email}")
             return False
         
-        # Verificar si expiró
-        if verification["expires_at"] < datetime.utcnow():
-            logger.warning(f"Código de verificación expirado para: {verify_data.email}")
-            return False
-        
-        # Obtener usuario
-        user = await self.get_user_by_email(verify_data.email)
+        # Marcar al usuario como verificado y obtener sus datos en el mismo round trip
+        user = await self.db.users.find_one_and_update(
+            {"email": verify_data.email},
+            {"$set": {"email_verified": True, "updated_at": datetime.utcnow()}},
+            projection={"email": True, "name": True},
+            return_document=ReturnDocument.AFTER
+        )
         if not user:
             return False
         
-        # Actualizar usuario como verificado
-        await self.update_user_verified(user.id)
-        
-        # Eliminar verificación
-        await self.db.verifications.delete_one({"_id": verification["_id"]})
-        
-        # Enviar email de bienvenida
-        try:
-            send_welcome_email(user.email, user.name)
-        except Exception as e:
-            logger.error(f"Error enviando email de bienvenida: {str(e)}")
+        # Enviar email de bienvenida (en segundo plano)
+        send_in_background(send_welcome_email, user["email"], user.get("name"))
         
         logger.info(f"Email verificado: {verify_data.email}")
         return True
@@ -418,7 +489,7 @@ class AuthService:
             email: Email del usuario
             
         Returns:
-            Código de verificación si se envió, None si no
+            Código de verificación si se generó, None si no
         """
         # Verificar que el usuario existe
         user = await self.get_user_by_email(email)
@@ -433,14 +504,10 @@ class AuthService:
         verification_code = generate_verification_code()
         await self._create_verification(email, verification_code)
         
-        # Enviar email
-        try:
-            send_verification_email(email, verification_code)
-            logger.info(f"Código de verificación reenviado a: {email}")
-            return verification_code
-        except Exception as e:
-            logger.error(f"Error reenviando código: {str(e)}")
-            return None
+        # Enviar email (en segundo plano; los errores de SMTP se registran en send_email)
+        send_in_background(send_verification_email, email, verification_code)
+        logger.info(f"Código de verificación reenviado a: {email}")
+        return verification_code
     
     # ========================================================================
     # PASSWORD RESET
@@ -454,7 +521,7 @@ class AuthService:
             request: Email del usuario
             
         Returns:
-            True si se envió el email, False si no
+            True (el email se envía en segundo plano)
         """
         # Verificar que el usuario existe
         user = await self.get_user_by_email(request.email)
@@ -469,14 +536,10 @@ class AuthService:
         # Guardar en verificaciones (reutilizamos la colección)
         await self._create_verification(user.email, reset_token)
         
-        # Enviar email
-        try:
-            send_password_reset_email(user.email, reset_token)
-            logger.info(f"Email de reset de password enviado a: {user.email}")
-            return True
-        except Exception as e:
-            logger.error(f"Error enviando email de reset: {str(e)}")
-            return False
+        # Enviar email (en segundo plano; los errores de SMTP se registran en send_email)
+        send_in_background(send_password_reset_email, user.email, reset_token)
+        logger.info(f"Email de reset de password encolado para: {user.email}")
+        return True
     
     async def reset_password(self, request: ResetPasswordRequest) -> bool:
         """
@@ -498,20 +561,23 @@ class AuthService:
         if not email:
             return False
         
-        # Obtener usuario
-        user = await self.get_user_by_email(email)
+        # Actualizar password buscando por email (una sola consulta, solo se trae el _id)
+        password_hash = await asyncio.to_thread(hash_password, request.new_password)
+        user = await self.db.users.find_one_and_update(
+            {"email": email},
+            {"$set": {"password_hash": password_hash, "updated_at": datetime.utcnow()}},
+            projection={"_id": True}
+        )
         if not user:
             return False
         
-        # Actualizar password
-        success = await self.update_user_password(user.id, request.new_password)
+        # Eliminar todas las sesiones del usuario (también las cacheadas)
+        user_id = str(user["_id"])
+        _invalidate_user(user_id)
+        await self.db.sessions.delete_many({"user_id": user_id})
+        logger.info(f"Password reseteado para: {email}")
         
-        if success:
-            # Eliminar todas las sesiones del usuario
-            await self.db.sessions.delete_many({"user_id": user.id})
-            logger.info(f"Password reseteado para: {email}")
-        
-        return success
+        return True
     
     # ========================================================================
     # OAUTH
@@ -572,3 +638,9 @@ class AuthService:
         
         account_doc["_id"] = str(account_doc["_id"])
         return OAuthAccountInDB(**account_doc)
+
+
+@lru_cache(maxsize=1)
+def get_auth_service() -> AuthService:
+    """Dependency para FastAPI: una única instancia de AuthService compartida entre requests"""
+    return AuthService()
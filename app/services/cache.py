@@ -0,0 +1,189 @@
+# app/services/cache.py
+
+import os
+import logging
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import orjson
+
+from app.schemas.analytics import Analytics
+from app.services.trade_parser_service import TradeParserService
+from app.services.trade_table import TradeTable
+from app.services.analytics_service import AnalyticsService
+from app.services import latest_csv, snapshot
+
+logger = logging.getLogger(__name__)
+
+# (path, st_mtime_ns, st_size): si el archivo cambia, la clave cambia y el cache se invalida solo
+LatestFile = Tuple[str, int, int]
+
+# ============================================================================
+# ARCHIVO MÁS RECIENTE
+# ============================================================================
+
+def _latest_csv() -> Optional[LatestFile]:
+    """
+    Obtener la clave de cache del archivo de operaciones más reciente.
+
+    El path sale del puntero mantenido por el watcher (latest_csv.LATEST),
+    así que el único acceso a disco por request es un stat.
+
+    Returns:
+        Tupla (path, mtime_ns, size) o None si no hay archivos
+    """
+    path = latest_csv.get_latest()
+    if path is None:
+        return None
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        path = latest_csv.rescan()
+        if path is None:
+            return None
+        stat = os.stat(path)
+
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def get_latest_file() -> Optional[LatestFile]:
+    """Obtener (path, mtime_ns, size) del archivo más reciente, o None si no hay archivos"""
+    return _latest_csv()
+
+
+def set_latest_file(path: str) -> LatestFile:
+    """
+    Marcar un archivo como el más reciente (ej: después de subirlo).
+
+    Returns:
+        Tupla (path, mtime_ns, size) del archivo
+    """
+    latest_csv.set_latest(path)
+    return _latest_csv()
+
+# ============================================================================
+# CACHE DE OPERACIONES Y ANALYTICS
+# ============================================================================
+
+@lru_cache(maxsize=4)
+def _load_table(path: str, mtime_ns: int, size: int) -> TradeTable:
+    """Cargar el archivo como TradeTable una sola vez por versión (mtime_ns, size)"""
+    logger.info(f"🗂️ Cache miss de TradeTable: {path}")
+    return TradeParserService.load_trades_as_table(path)
+
+
+@lru_cache(maxsize=4)
+def _compute_analytics(path: str, mtime_ns: int, size: int) -> Analytics:
+    """
+    Obtener analytics una sola vez por versión (mtime_ns, size).
+
+    Primero se busca el snapshot en disco (sobrevive a reinicios); si no hay,
+    se valida y calcula sobre la TradeTable cacheada y se guarda el snapshot.
+    """
+    analytics = snapshot.load_snapshot(path, mtime_ns, size)
+    if analytics is not None:
+        logger.info(f"🗂️ Analytics desde snapshot: {path}")
+        return analytics
+
+    logger.info(f"🗂️ Cache miss de analytics: {path}")
+    analytics = AnalyticsService.validate_and_summarize(_load_table(path, mtime_ns, size))
+    snapshot.save_snapshot(path, mtime_ns, size, analytics)
+    return analytics
+
+
+def get_cached_table(latest: LatestFile) -> TradeTable:
+    """
+    Obtener las operaciones del archivo como TradeTable desde el cache.
+
+    Args:
+        latest: Tupla (path, mtime_ns, size) de get_latest_file()
+
+    Returns:
+        TradeTable con un array por columna (compartida entre requests, no modificar)
+    """
+    return _load_table(*latest)
+
+
+def get_cached(latest: LatestFile) -> Tuple[TradeTable, Analytics]:
+    """
+    Obtener operaciones y analytics precalculados del archivo.
+
+    Args:
+        latest: Tupla (path, mtime_ns, size) de get_latest_file()
+
+    Returns:
+        Tupla (table, analytics)
+    """
+    return _load_table(*latest), _compute_analytics(*latest)
+
+
+def _analytics_view(analytics: Analytics, view: str) -> bytes:
+    """Cuerpo JSON de una vista de los analytics (summary, by-symbol, daily-stats, monthly-stats)"""
+    if view == 'summary':
+        return analytics.model_dump_json().encode()
+    if view == 'by-symbol':
+        content = {
+            'symbols': analytics.symbol_stats,
+            'total_symbols': len(analytics.symbol_stats)
+        }
+    elif view == 'daily-stats':
+        content = {'daily_stats': [day.model_dump() for day in analytics.daily_stats]}
+    elif view == 'monthly-stats':
+        content = {'monthly_stats': [month.model_dump() for month in analytics.monthly_stats]}
+    else:
+        raise ValueError(f"Vista de analytics desconocida: {view}")
+    return orjson.dumps(content)
+
+
+@lru_cache(maxsize=16)
+def _analytics_json(path: str, mtime_ns: int, size: int, view: str) -> bytes:
+    """Serializar una vista de los analytics una sola vez por versión (mtime_ns, size)"""
+    return _analytics_view(_compute_analytics(path, mtime_ns, size), view)
+
+
+def get_cached_analytics(latest: LatestFile) -> Analytics:
+    """
+    Obtener solo los analytics del archivo (sin cargar la TradeTable si hay snapshot).
+
+    Args:
+        latest: Tupla (path, mtime_ns, size) de get_latest_file()
+    """
+    return _compute_analytics(*latest)
+
+
+def get_cached_json(latest: LatestFile, view: str = 'summary') -> bytes:
+    """
+    Obtener una vista de los analytics del archivo ya serializada a JSON.
+    
+    Los endpoints sin parámetros devuelven siempre lo mismo para una versión
+    del archivo, así que el cuerpo se calcula y serializa una sola vez.
+
+    Args:
+        latest: Tupla (path, mtime_ns, size) de get_latest_file()
+        view: summary, by-symbol, daily-stats o monthly-stats
+
+    Returns:
+        Cuerpo JSON (compartido entre requests)
+    """
+    return _analytics_json(*latest, view)
+
+
+def precompute(latest: LatestFile):
+    """
+    Calcular y persistir los analytics de un archivo (para usar como tarea en segundo plano).
+
+    Los errores solo se registran: el endpoint que los necesite volverá a intentarlo.
+    """
+    try:
+        _compute_analytics(*latest)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudieron precalcular analytics de {latest[0]}: {e}")
+
+
+def clear_cache():
+    """Vaciar todos los caches (útil en tests)"""
+    _load_table.cache_clear()
+    _compute_analytics.cache_clear()
+    _analytics_json.cache_clear()
+    latest_csv.reset()
@@ -0,0 +1,143 @@
+# app/services/kernels.py
+
+import numpy as np
+from typing import Tuple
+
+# ============================================================================
+# KERNELS NUMÉRICOS (NumPy puro, sin DataFrames intermedios)
+# ============================================================================
+
+def hourly_stats(hour: np.ndarray, profit: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sumar profit y contar operaciones por hora del día en una sola pasada.
+
+    Args:
+        hour: Hora de apertura de cada operación (0-23)
+        profit: Profit en $ de cada operación
+
+    Returns:
+        Tupla (sumas, conteos), ambos de 24 posiciones
+    """
+    hour = np.asarray(hour, dtype=np.intp)
+    sums = np.bincount(hour, weights=np.asarray(profit, dtype=np.float64), minlength=24)
+    counts = np.bincount(hour, minlength=24)
+    return sums, counts
+
+
+def best_bucket(sums: np.ndarray, counts: np.ndarray) -> int:
+    """
+    Índice con mayor promedio, ignorando los buckets vacíos.
+
+    Returns:
+        Índice del bucket (0 si no hay datos)
+    """
+    if not counts.any():
+        return 0
+    means = np.divide(sums, counts, out=np.full(sums.shape, -np.inf), where=counts > 0)
+    return int(means.argmax())
+
+
+def equity_and_drawdown(profit: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Curva de capital y drawdown con un solo buffer extra (ufuncs con out=).
+
+    El máximo acumulado se calcula sobre el buffer del drawdown y se le resta
+    la curva en el sitio, así no se reserva un array por paso intermedio.
+    El pico máximo de la curva es equity.max() si hace falta.
+
+    Args:
+        profit: Profit en $ de cada operación, en orden cronológico
+
+    Returns:
+        Tupla (equity, drawdown); drawdown = equity - peak (<= 0, en $)
+    """
+    profit = np.asarray(profit, dtype=np.float64)
+    equity = np.empty_like(profit)
+    drawdown = np.empty_like(profit)
+    if profit.size == 0:
+        return equity, drawdown
+    np.cumsum(profit, out=equity)
+    np.maximum.accumulate(equity, out=drawdown)
+    np.subtract(equity, drawdown, out=drawdown)
+    return equity, drawdown
+
+
+def group_stats(
+    codes: np.ndarray, n_groups: int, profit: np.ndarray, is_win: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Conteo, suma de profit y operaciones ganadoras por grupo con bincount.
+
+    Args:
+        codes: Índice de grupo (0..n_groups-1) de cada operación
+        n_groups: Número de grupos
+        profit: Profit en $ de cada operación
+        is_win: Máscara profit > 0, calculada una vez y compartida entre agrupaciones
+
+    Returns:
+        Tupla (conteos, sumas, ganadoras), cada una de n_groups posiciones
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=profit, minlength=n_groups)
+    wins = np.bincount(codes[is_win], minlength=n_groups)
+    return counts, sums, wins
+
+
+def longest_runs(sign: np.ndarray) -> Tuple[int, int]:
+    """
+    Racha más larga de valores positivos y de valores negativos consecutivos.
+
+    Una sola detección de cambios de signo; las longitudes de racha salen de
+    las posiciones de corte y los máximos se toman con where= (sin copias filtradas).
+
+    Args:
+        sign: Signo (-1, 0, 1) de cada operación en orden cronológico (int8)
+
+    Returns:
+        Tupla (racha ganadora más larga, racha perdedora más larga)
+    """
+    if sign.size == 0:
+        return 0, 0
+    bounds = np.flatnonzero(sign[1:] != sign[:-1]) + 1
+    starts = np.concatenate(([0], bounds))
+    lengths = np.diff(starts, append=sign.size)
+    run_sign = sign[starts]
+    longest_win = int(np.max(lengths, where=run_sign > 0, initial=0))
+    longest_loss = int(np.max(lengths, where=run_sign < 0, initial=0))
+    return longest_win, longest_loss
+
+
+def sorted_codes(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Valores distintos y código de grupo de un array ya ordenado.
+
+    Equivale a np.unique(keys, return_inverse=True) sin volver a ordenar:
+    cada cambio de valor abre un grupo nuevo.
+
+    Returns:
+        Tupla (valores distintos, código 0..n-1 de cada posición)
+    """
+    if keys.size == 0:
+        return keys[:0], np.zeros(0, dtype=np.intp)
+    is_new = np.empty(keys.size, dtype=bool)
+    is_new[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=is_new[1:])
+    codes = np.cumsum(is_new, dtype=np.intp) - 1
+    return keys[is_new], codes
+
+
+def bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Contar valores en intervalos (e[i], e[i+1]], incluyendo el borde inferior del primero.
+
+    Equivale a pd.cut(values, edges, include_lowest=True) + value_counts(sort=False);
+    los valores fuera de rango o NaN no se cuentan.
+
+    Returns:
+        Conteos, len(edges) - 1 posiciones
+    """
+    n_bins = len(edges) - 1
+    idx = np.searchsorted(edges, values, side='left') - 1
+    idx[values == edges[0]] = 0
+    valid = (idx >= 0) & (idx < n_bins)
+    return np.bincount(idx[valid], minlength=n_bins)
@@ -0,0 +1,116 @@
+# app/services/latest_csv.py
+
+import os
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional
+
+from watchfiles import awatch, Change
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+RAW_DATA_DIR = os.getenv("DATA_RAW_DIR", "data/raw")
+DATA_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Puntero al archivo de operaciones más reciente (mantenido por el watcher)
+LATEST: Optional[Path] = None
+
+_watcher_task: Optional[asyncio.Task] = None
+_stop_event: Optional[asyncio.Event] = None
+
+# ============================================================================
+# PUNTERO AL ÚLTIMO ARCHIVO
+# ============================================================================
+
+def _initial_scan() -> Optional[Path]:
+    """
+    Escanear RAW_DATA_DIR y apuntar LATEST al archivo con mayor mtime.
+
+    Solo se usa al arrancar o cuando el puntero queda inválido;
+    en el camino normal LATEST lo actualiza el watcher.
+
+    Returns:
+        Path del archivo más reciente o None si no hay archivos
+    """
+    global LATEST
+
+    candidates = []
+    try:
+        with os.scandir(RAW_DATA_DIR) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(DATA_EXTENSIONS):
+                    candidates.append((entry.stat().st_mtime_ns, entry.path))
+    except FileNotFoundError:
+        pass
+
+    LATEST = Path(os.path.abspath(max(candidates, key=lambda c: c[0])[1])) if candidates else None
+    return LATEST
+
+
+def get_latest() -> Optional[Path]:
+    """Obtener el archivo más reciente sin tocar el disco si el puntero ya existe"""
+    return LATEST or _initial_scan()
+
+
+def set_latest(path: str):
+    """Apuntar LATEST a un archivo (ej: recién subido, sin esperar al evento)"""
+    global LATEST
+    LATEST = Path(os.path.abspath(path))
+
+
+def rescan() -> Optional[Path]:
+    """Descartar el puntero actual y volver a escanear el directorio"""
+    return _initial_scan()
+
+
+def reset():
+    """Olvidar el puntero (útil en tests)"""
+    global LATEST
+    LATEST = None
+
+# ============================================================================
+# WATCHER
+# ============================================================================
+
+async def _watch_raw_dir(stop_event: asyncio.Event):
+    """Actualizar LATEST con los eventos del sistema de archivos en RAW_DATA_DIR"""
+    global LATEST
+
+    async for changes in awatch(RAW_DATA_DIR, stop_event=stop_event, recursive=False):
+        for change, path in changes:
+            if not path.endswith(DATA_EXTENSIONS):
+                continue
+            if change in (Change.added, Change.modified):
+                LATEST = Path(os.path.abspath(path))
+                logger.info(f"📂 Archivo más reciente: {LATEST.name}")
+            elif change == Change.deleted and LATEST is not None and str(LATEST) == os.path.abspath(path):
+                _initial_scan()
+
+
+def start_watcher():
+    """Arrancar el watcher de RAW_DATA_DIR como tarea del event loop"""
+    global _watcher_task, _stop_event
+
+    if _watcher_task is not None:
+        return
+
+    os.makedirs(RAW_DATA_DIR, exist_ok=True)
+    _initial_scan()
+    _stop_event = asyncio.Event()
+    _watcher_task = asyncio.create_task(_watch_raw_dir(_stop_event))
+    logger.info(f"👀 Vigilando {RAW_DATA_DIR}")
+
+
+async def stop_watcher():
+    """Detener el watcher de RAW_DATA_DIR"""
+    global _watcher_task, _stop_event
+
+    if _watcher_task is None:
+        return
+
+    _stop_event.set()
+    await _watcher_task
+    _watcher_task = None
+    _stop_event = None
@@ -0,0 +1,76 @@
+# app/services/snapshot.py
+
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+
+import orjson
+from pydantic import ValidationError
+
+from app.schemas.analytics import Analytics
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR", "data/cache")
+# Segundos tras los que un snapshot se recalcula aunque el archivo no cambie
+# (ej: después de cambiar el cálculo de analytics). 0 = solo cuando cambia el archivo
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "0"))
+
+# ============================================================================
+# SNAPSHOTS DE ANALYTICS EN DISCO
+# ============================================================================
+
+def _snapshot_path(path: str) -> Path:
+    """data/cache/{archivo}.analytics.json para cada archivo de operaciones"""
+    return Path(DATA_CACHE_DIR) / f"{Path(path).name}.analytics.json"
+
+
+def load_snapshot(path: str, mtime_ns: int, size: int) -> Optional[Analytics]:
+    """
+    Leer los analytics precalculados de un archivo si corresponden a esa versión.
+
+    Returns:
+        Analytics o None si no hay snapshot, es de otra versión (mtime_ns, size) o expiró
+    """
+    snapshot_path = _snapshot_path(path)
+    try:
+        if SNAPSHOT_MAX_AGE and time.time() - snapshot_path.stat().st_mtime > SNAPSHOT_MAX_AGE:
+            return None
+        data = orjson.loads(snapshot_path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.warning(f"⚠️ Snapshot ilegible {snapshot_path}: {e}")
+        return None
+
+    if data.get('mtime_ns') != mtime_ns or data.get('size') != size:
+        return None
+
+    try:
+        return Analytics.model_validate(data['analytics'])
+    except (KeyError, ValidationError) as e:
+        logger.warning(f"⚠️ Snapshot inválido {snapshot_path}: {e}")
+        return None
+
+
+def save_snapshot(path: str, mtime_ns: int, size: int, analytics: Analytics):
+    """
+    Guardar los analytics de una versión del archivo (escritura atómica con os.replace).
+    """
+    snapshot_path = _snapshot_path(path)
+    tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.tmp")
+    try:
+        os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+        tmp_path.write_bytes(orjson.dumps({
+            'mtime_ns': mtime_ns,
+            'size': size,
+            'analytics': analytics.model_dump(mode='json')
+        }))
+        os.replace(tmp_path, snapshot_path)
+        logger.info(f"💾 Snapshot de analytics guardado: {snapshot_path}")
+    except OSError as e:
+        # Sin snapshot se sigue funcionando: solo se pierde el atajo al reiniciar
+        logger.warning(f"⚠️ No se pudo guardar el snapshot {snapshot_path}: {e}")
@@ -1,146 +1,274 @@
 # app/services/trade_parser_service.py
 
+import asyncio
 import pandas as pd
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict
 from pathlib import Path
 from app.schemas.trade import Trade
+from app.services.trade_table import TradeTable
 
 logger = logging.getLogger(__name__)
 
+# Manejar columnas duplicadas (Time, Price) en reportes de MT5
+# Pandas renombra duplicados automáticamente: Time, Time.1, Price, Price.1
+COLUMN_MAPPING = {
+    'Time': 'open_time',
+    'Time.1': 'close_time',
+    'Price': 'open_price',
+    'Price.1': 'close_price',
+    'Symbol': 'symbol',
+    'Type': 'order_type',
+    'Volume': 'volume',
+    'Profit': 'profit_usd',
+    'Commission': 'commission',
+    'Swap': 'swap',
+    'S / L': 'sl',
+    'T / P': 'tp',
+    'Comment': 'comment',
+    # Variantes español
+    'Símbolo': 'symbol',
+    'Tipo': 'order_type',
+    'Volumen': 'volume',
+    'Ganancias': 'profit_usd',
+    'Comisión': 'commission',
+    'Comente': 'comment'
+}
+
+# Campos que se usan para construir las operaciones
+TRADE_FIELDS = ('open_time', 'close_time', 'symbol', 'order_type', 'volume',
+                'open_price', 'close_price', 'profit_usd', 'spread', 'comment')
+
+# Columnas del CSV que se leen (el resto, ej: S / L, Swap, Position, no se materializan)
+TRADE_COLUMNS = frozenset(TRADE_FIELDS) | {src for src, dst in COLUMN_MAPPING.items() if dst in TRADE_FIELDS}
+
+# Texto leído como str sin inferencia de tipos; los números se infieren porque
+# las filas no numéricas (balance, totales) se descartan después fila a fila
+TRADE_DTYPES = {col: str for col in TRADE_COLUMNS
+                if COLUMN_MAPPING.get(col, col) in ('open_time', 'close_time', 'symbol', 'order_type', 'comment')}
+
+# Formato de fecha de los reportes de MT5
+MT5_TIME_FORMAT = '%Y.%m.%d %H:%M:%S'
+
+# Tipos de orden que son operaciones (el resto de filas son balance, totales, etc.)
+ORDER_TYPES = frozenset({'buy', 'sell'})
+
+
 class TradeParserService:
     """Parsear operaciones desde CSV o XLSX exportado de MT5"""
     
+    @staticmethod
+    def _read_file(file_path: str) -> pd.DataFrame:
+        """Leer CSV o XLSX, renombrar columnas MT5 y validar las requeridas"""
+        # Detectar extensión del archivo
+        file_extension = Path(file_path).suffix.lower()
+        
+        # Leer archivo según extensión
+        if file_extension == '.csv':
+            # Solo se materializan las columnas de Trade; el header completo se lee
+            # aparte (nrows=0) para poder mostrar las columnas reales del archivo
+            source_columns = list(pd.read_csv(file_path, encoding='utf-8', nrows=0).columns)
+            df = pd.read_csv(
+                file_path,
+                encoding='utf-8',
+                usecols=lambda col: col in TRADE_COLUMNS,
+                dtype=TRADE_DTYPES
+            )
+            logger.info(f"📄 Leyendo archivo CSV: {file_path}")
+        elif file_extension in ['.xlsx', '.xls']:
+            # Leer primero sin header para buscar dónde empiezan los datos
+            df_temp = pd.read_excel(file_path, engine='openpyxl', header=None)
+            
+            # Buscar la fila del encabezado (primera con celdas 'time' y 'symbol'), por columnas
+            lowered = df_temp.astype(str).apply(lambda col: col.str.lower())
+            is_header = lowered.eq('time').any(axis=1) & lowered.eq('symbol').any(axis=1)
+            header_row_idx = int(is_header.idxmax()) if is_header.any() else -1
+            
+            if header_row_idx != -1:
+                # Usar la fila encontrada como header sin volver a leer el archivo
+                df = TradeParserService._frame_below_header(df_temp, header_row_idx)
+                logger.info(f"📊 Header encontrado en fila {header_row_idx}")
+            else:
+                # Si no se encuentra, la primera fila es el header (quizás ya está limpio)
+                df = TradeParserService._frame_below_header(df_temp, 0)
+                logger.info(f"📊 No se detectó fila de header específica, leyendo normal")
+            source_columns = list(df.columns)
+
+        else:
+            raise ValueError(f"Formato de archivo no soportado: {file_extension}. Use .csv o .xlsx")
+        
+        # Mostrar columnas originales para debug (todas, no solo las leídas)
+        logger.info(f"📋 Columnas encontradas: {source_columns}")
+        
+        df.rename(columns=COLUMN_MAPPING, inplace=True)
+        renamed_columns = [COLUMN_MAPPING.get(col, col) for col in source_columns]
+        
+        logger.info(f"📋 Columnas después del renombrado: {renamed_columns}")
+        
+        # Validar que existan las columnas requeridas
+        required_columns = ['open_time', 'close_time', 'symbol', 'order_type', 'volume', 
+                          'open_price', 'close_price', 'profit_usd']
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        
+        if missing_columns:
+            error_msg = f"❌ Faltan columnas requeridas: {missing_columns}\n"
+            error_msg += f"📋 Columnas disponibles: {renamed_columns}\n"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        return df
+
+    @staticmethod
+    def _frame_below_header(raw: pd.DataFrame, header_row_idx: int) -> pd.DataFrame:
+        """
+        Convertir una hoja leída con header=None en el DataFrame que daría
+        read_excel(header=header_row_idx), sin parsear el XLSX una segunda vez.
+        
+        Igual que pandas: celdas de header vacías -> 'Unnamed: i' y nombres
+        repetidos -> 'Time', 'Time.1', ...; los tipos se infieren por columna.
+        """
+        if raw.empty:
+            return raw
+        
+        columns = []
+        seen: Dict[str, int] = {}
+        for i, value in enumerate(raw.iloc[header_row_idx]):
+            name = f"Unnamed: {i}" if pd.isna(value) else str(value)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            seen.setdefault(name, 0)
+            columns.append(name)
+        
+        df = raw.iloc[header_row_idx + 1:].reset_index(drop=True)
+        df.columns = columns
+        return df.infer_objects()
+
     @staticmethod
     def load_trades_from_file(file_path: str) -> List[Trade]:
-        """Cargar operaciones desde archivo CSV o XLSX"""
+        """
+        Cargar operaciones desde archivo CSV o XLSX como modelos Trade.
+        
+        El parseo y los cálculos (profit_pct, duración, estado) se hacen por
+        columnas en load_trades_as_df; los modelos se construyen al final.
+        """
+        trades = TradeParserService.load_trades_as_table(file_path).to_models()
+        logger.info(f"✅ Cargadas {len(trades)} operaciones desde {file_path}")
+        return trades
+
+    @staticmethod
+    async def load_trades_from_files(file_paths: List[str]) -> List[List[Trade]]:
+        """
+        Cargar varios archivos a la vez, cada uno en un hilo del pool por defecto.
+        
+        El parseo de pandas/openpyxl bloquea, así que se saca del event loop;
+        los archivos se leen en paralelo en vez de uno detrás de otro.
+        
+        Returns:
+            Una lista de operaciones por archivo, en el mismo orden que file_paths
+        """
+        return list(await asyncio.gather(*(
+            asyncio.to_thread(TradeParserService.load_trades_from_file, path)
+            for path in file_paths
+        )))
+
+    @staticmethod
+    def _parse_times(column: pd.Series) -> pd.Series:
+        """
+        Parsear una columna de fechas MT5 (2025.07.08 15:52:55) de una sola vez.
+        
+        Con el formato explícito de MT5 no se pasa por el parser genérico; si
+        algún valor no lo cumple, la columna se parsea con format='mixed'.
+        """
+        if pd.api.types.is_datetime64_any_dtype(column):
+            return column
+        parsed = pd.to_datetime(column, format=MT5_TIME_FORMAT, errors='coerce')
+        if (parsed.notna() | column.isna()).all():
+            return parsed
+        return pd.to_datetime(column.astype(str).str.replace('.', '-', regex=False), format='mixed', errors='coerce')
+
+    @staticmethod
+    def load_trades_as_df(file_path: str) -> pd.DataFrame:
+        """
+        Cargar operaciones como DataFrame tipado, sin construir modelos Trade.
+        
+        Descarta filas que no son operaciones (balance, totales) o con valores
+        no numéricos/fechas inválidas, todo con máscaras vectorizadas.
+        
+        Returns:
+            DataFrame con las columnas de Trade (open_time/close_time como datetime64)
+        """
         try:
-            # Detectar extensión del archivo
-            file_extension = Path(file_path).suffix.lower()
+            df = TradeParserService._read_file(file_path)
             
-            # Leer archivo según extensión
-            if file_extension == '.csv':
-                df = pd.read_csv(file_path, encoding='utf-8')
-                logger.info(f"📄 Leyendo archivo CSV: {file_path}")
-            elif file_extension in ['.xlsx', '.xls']:
-                # Leer primero sin header para buscar dónde empiezan los datos
-                df_temp = pd.read_excel(file_path, engine='openpyxl', header=None)
-                
-                # Buscar la fila del encabezado
-                header_row_idx = -1
-                for idx, row in df_temp.iterrows():
-                    row_str = row.astype(str).str.lower().tolist()
-                    if 'time' in row_str and 'symbol' in row_str:
-                        header_row_idx = idx
-                        break
-                
-                if header_row_idx != -1:
-                    # Volver a leer usando la fila correcta como header
-                    df = pd.read_excel(file_path, engine='openpyxl', header=header_row_idx)
-                    logger.info(f"📊 Header encontrado en fila {header_row_idx}")
-                else:
-                    # Si no se encuentra, intentar leer normal (quizás ya está limpio)
-                    df = pd.read_excel(file_path, engine='openpyxl')
-                    logger.info(f"📊 No se detectó fila de header específica, leyendo normal")
-
-            else:
-                raise ValueError(f"Formato de archivo no soportado: {file_extension}. Use .csv o .xlsx")
+            # Ignorar filas que no sean operaciones (ej: balance inicial, totales)
+            df = df[df['symbol'].notna() & df['order_type'].astype(str).str.lower().isin(ORDER_TYPES)]
+            
+            numeric = {}
+            valid = pd.Series(True, index=df.index)
+            for col in ['volume', 'open_price', 'close_price', 'profit_usd']:
+                numeric[col] = pd.to_numeric(df[col], errors='coerce')
+                valid &= numeric[col].notna() | df[col].isna()
             
-            # Mostrar columnas originales para debug
-            logger.info(f"📋 Columnas encontradas: {list(df.columns)}")
+            open_dt = TradeParserService._parse_times(df['open_time'])
+            close_dt = TradeParserService._parse_times(df['close_time'])
+            valid &= open_dt.notna() & close_dt.notna()
             
-            # Manejar columnas duplicadas (Time, Price) en reportes de MT5
-            # Pandas renombra duplicados automáticamente: Time, Time.1, Price, Price.1
-            column_mapping_duplicates = {
-                'Time': 'open_time',
-                'Time.1': 'close_time',
-                'Price': 'open_price',
-                'Price.1': 'close_price',
-                'Symbol': 'symbol',
-                'Type': 'order_type',
-                'Volume': 'volume',
-                'Profit': 'profit_usd',
-                'Commission': 'commission',
-                'Swap': 'swap',
-                'S / L': 'sl',
-                'T / P': 'tp',
-                'Comment': 'comment',
-                # Variantes español
-                'Símbolo': 'symbol',
-                'Tipo': 'order_type',
-                'Volumen': 'volume',
-                'Ganancias': 'profit_usd',
-                'Comisión': 'commission',
-                'Comente': 'comment'
-            }
-            df.rename(columns=column_mapping_duplicates, inplace=True)
+            skipped = int((~valid).sum())
+            if skipped:
+                logger.warning(f"⚠️ Saltando {skipped} filas con valores inválidos")
             
-            logger.info(f"📋 Columnas después del renombrado: {list(df.columns)}")
+            profit = numeric['profit_usd'][valid].astype('float64')
+            volume = numeric['volume'][valid].astype('float64')
+            open_price = numeric['open_price'][valid].astype('float64')
+            close_price = numeric['close_price'][valid].astype('float64')
+            open_dt = open_dt[valid]
+            close_dt = close_dt[valid]
             
-            # Validar que existan las columnas requeridas
-            required_columns = ['open_time', 'close_time', 'symbol', 'order_type', 'volume', 
-                              'open_price', 'close_price', 'profit_usd']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            # Calcular profit_pct de forma segura (0 si no hay volumen/precio)
+            denominator = (open_price * volume * 100).abs()
+            profit_pct = (profit / denominator * 100).where(denominator != 0, 0.0)
             
-            if missing_columns:
-                error_msg = f"❌ Faltan columnas requeridas: {missing_columns}\n"
-                error_msg += f"📋 Columnas disponibles: {list(df.columns)}\n"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
+            status = pd.Series('BREAK_EVEN', index=profit.index)
+            status[profit > 0] = 'GANADOR'
+            status[profit < 0] = 'PERDEDOR'
             
-            trades = []
-            for idx, row in df.iterrows():
-                try:
-                    # Ignorar filas que no sean operaciones (ej: balance inicial, totales)
-                    if pd.isna(row['symbol']) or str(row['order_type']).lower() not in ['buy', 'sell']:
-                        continue
-                        
-                    # Calcular profit_pct de forma segura
-                    try:
-                        profit_pct = (float(row['profit_usd']) / abs(float(row['open_price']) * float(row['volume']) * 100)) * 100
-                    except (ZeroDivisionError, ValueError):
-                        profit_pct = 0.0
-                    
-                    # Calcular duración
-                    try:
-                        # Manejar formato de fecha con puntos (2025.07.08 15:52:55)
-                        open_dt = pd.to_datetime(str(row['open_time']).replace('.', '-'))
-                        close_dt = pd.to_datetime(str(row['close_time']).replace('.', '-'))
-                        duration = int((close_dt - open_dt).total_seconds() / 60)
-                    except:
-                        duration = 0
-                        open_dt = row['open_time'] # Fallback
-                        close_dt = row['close_time'] # Fallback
-                    
-                    trade = Trade(
-                        id=int(idx),
-                        open_time=open_dt,
-                        close_time=close_dt,
-                        symbol=str(row['symbol']).strip(),
-                        order_type=str(row['order_type']).upper(),
-                        volume=float(row['volume']),
-                        open_price=float(row['open_price']),
-                        close_price=float(row['close_price']),
-                        profit_usd=float(row['profit_usd']),
-                        profit_pct=profit_pct,
-                        duration=duration,
-                        spread=float(row.get('spread', 0)) if 'spread' in row else None,
-                        comment=str(row.get('comment', '')) if 'comment' in row else None,
-                        status='GANADOR' if float(row['profit_usd']) > 0 else ('PERDEDOR' if float(row['profit_usd']) < 0 else 'BREAK_EVEN')
-                    )
-                    trades.append(trade)
-                except Exception as row_error:
-                    logger.warning(f"⚠️ Saltando fila {idx} por error: {row_error}")
-                    continue
+            rows = df[valid]
+            result = pd.DataFrame({
+                'id': rows.index.astype('int64'),
+                'open_time': open_dt.values,
+                'close_time': close_dt.values,
+                'symbol': rows['symbol'].astype(str).str.strip().values,
+                'order_type': rows['order_type'].astype(str).str.upper().values,
+                'volume': volume.values,
+                'open_price': open_price.values,
+                'close_price': close_price.values,
+                'profit_usd': profit.values,
+                'profit_pct': profit_pct.values,
+                'duration': ((close_dt - open_dt).dt.total_seconds() / 60).astype('int64').values,
+                'spread': pd.to_numeric(rows['spread'], errors='coerce').values if 'spread' in rows else None,
+                'comment': rows['comment'].astype(str).values if 'comment' in rows else None,
+                'status': status.values
+            })
             
-            logger.info(f"✅ Cargadas {len(trades)} operaciones desde {file_path}")
-            return trades
+            logger.info(f"✅ Cargadas {len(result)} operaciones (DataFrame) desde {file_path}")
+            return result
             
         except Exception as e:
-            logger.error(f"❌ Error cargando CSV: {e}")
+            logger.error(f"❌ Error cargando archivo: {e}")
             raise
 
+    @staticmethod
+    def load_trades_as_table(file_path: str) -> TradeTable:
+        """
+        Cargar operaciones como TradeTable (un array por columna).
+        
+        Returns:
+            TradeTable con symbol/status codificados como categorías
+        """
+        return TradeTable.from_frame(TradeParserService.load_trades_as_df(file_path))
+
     @staticmethod
     def validate_trade_data(trades: List[Trade]) -> bool:
         """Validar integridad de datos"""
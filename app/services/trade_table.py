@@ -0,0 +1,148 @@
+# app/services/trade_table.py
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Any, Dict, List, Union
+
+from app.schemas.trade import Trade
+
+# Índices (np.flatnonzero) o máscara booleana sobre las filas de la tabla
+Selection = Union[np.ndarray, slice, None]
+
+NS_PER_HOUR = 3_600_000_000_000
+
+# ============================================================================
+# TABLA COLUMNAR DE OPERACIONES (Struct-of-Arrays)
+# ============================================================================
+
+@dataclass(frozen=True)
+class TradeTable:
+    """
+    Operaciones guardadas por columnas (un np.ndarray por campo de Trade).
+
+    Los kernels de analytics trabajan directamente sobre los arrays; los
+    modelos Trade solo se construyen al serializar el resultado final
+    (ver to_models). symbol y status se guardan como códigos categóricos.
+    """
+
+    id: np.ndarray                   # int64
+    open_time_ns: np.ndarray         # int64 (ns desde epoch, hora local naive)
+    close_time_ns: np.ndarray        # int64
+    symbol_codes: np.ndarray         # int32, índices en symbol_categories
+    symbol_categories: np.ndarray    # object
+    order_type: np.ndarray           # object
+    volume: np.ndarray               # float64
+    open_price: np.ndarray           # float64
+    close_price: np.ndarray          # float64
+    profit_usd: np.ndarray           # float64
+    profit_pct: np.ndarray           # float64
+    duration: np.ndarray             # int64 (minutos)
+    spread: np.ndarray               # float64 (NaN = sin spread)
+    comment: np.ndarray              # object (None = sin comentario)
+    status_codes: np.ndarray         # int8, índices en status_categories
+    status_categories: np.ndarray    # object
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "TradeTable":
+        """
+        Construir la tabla desde el DataFrame tipado de TradeParserService.load_trades_as_df.
+        """
+        symbol = pd.Categorical(df['symbol'])
+        status = pd.Categorical(df['status'])
+
+        spread = df['spread'] if 'spread' in df else pd.Series(np.nan, index=df.index)
+        comment = df['comment'] if 'comment' in df else pd.Series(None, index=df.index, dtype=object)
+
+        return cls(
+            id=df['id'].to_numpy(dtype=np.int64),
+            open_time_ns=df['open_time'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+            close_time_ns=df['close_time'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+            symbol_codes=symbol.codes.astype(np.int32),
+            symbol_categories=np.asarray(symbol.categories, dtype=object),
+            order_type=df['order_type'].to_numpy(dtype=object),
+            volume=df['volume'].to_numpy(dtype=np.float64),
+            open_price=df['open_price'].to_numpy(dtype=np.float64),
+            close_price=df['close_price'].to_numpy(dtype=np.float64),
+            profit_usd=df['profit_usd'].to_numpy(dtype=np.float64),
+            profit_pct=df['profit_pct'].to_numpy(dtype=np.float64),
+            duration=df['duration'].to_numpy(dtype=np.int64),
+            spread=pd.to_numeric(spread, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan),
+            comment=np.asarray(comment.astype(object).where(comment.notna(), None), dtype=object),
+            status_codes=status.codes.astype(np.int8),
+            status_categories=np.asarray(status.categories, dtype=object),
+        )
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    # ========================================================================
+    # MÁSCARAS
+    # ========================================================================
+
+    def all(self) -> np.ndarray:
+        """Máscara con todas las filas seleccionadas"""
+        return np.ones(len(self), dtype=bool)
+
+    def symbol_mask(self, symbol: str) -> np.ndarray:
+        """Filas cuyo símbolo es `symbol` (comparando códigos, no strings)"""
+        return self.symbol_codes == self._code(self.symbol_categories, symbol)
+
+    def status_mask(self, status: str) -> np.ndarray:
+        """Filas cuyo estado es `status` (GANADOR, PERDEDOR, BREAK_EVEN)"""
+        return self.status_codes == self._code(self.status_categories, status)
+
+    @staticmethod
+    def _code(categories: np.ndarray, value: str) -> int:
+        """Código de una categoría, o -1 (no coincide con ninguna fila) si no existe"""
+        matches = np.flatnonzero(categories == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def open_hours(self) -> np.ndarray:
+        """Hora del día (0-23) de apertura de cada operación"""
+        return (self.open_time_ns // NS_PER_HOUR) % 24
+
+    # ========================================================================
+    # MATERIALIZACIÓN
+    # ========================================================================
+
+    def to_records(self, selection: Selection = None) -> List[Dict[str, Any]]:
+        """
+        Convertir las filas seleccionadas a dicts con escalares nativos de Python.
+
+        Args:
+            selection: Máscara booleana, array de índices o slice (None = todas)
+
+        Returns:
+            Lista de dicts con los campos de Trade, en el orden original
+        """
+        sel = slice(None) if selection is None else selection
+
+        columns = {
+            'id': self.id[sel].tolist(),
+            'open_time': self.open_time_ns[sel].astype('datetime64[ns]').astype('datetime64[us]').tolist(),
+            'close_time': self.close_time_ns[sel].astype('datetime64[ns]').astype('datetime64[us]').tolist(),
+            'symbol': self.symbol_categories[self.symbol_codes[sel]].tolist(),
+            'order_type': self.order_type[sel].tolist(),
+            'volume': self.volume[sel].tolist(),
+            'open_price': self.open_price[sel].tolist(),
+            'close_price': self.close_price[sel].tolist(),
+            'profit_usd': self.profit_usd[sel].tolist(),
+            'profit_pct': self.profit_pct[sel].tolist(),
+            'duration': self.duration[sel].tolist(),
+            'spread': [None if s != s else s for s in self.spread[sel].tolist()],
+            'comment': self.comment[sel].tolist(),
+            'status': self.status_categories[self.status_codes[sel]].tolist(),
+        }
+
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def to_models(self, selection: Selection = None) -> List[Trade]:
+        """
+        Construir modelos Trade solo para las filas seleccionadas.
+
+        Los datos ya se validaron al parsear el archivo, así que se usa
+        model_construct (sin revalidar cada campo).
+        """
+        return [Trade.model_construct(**record) for record in self.to_records(selection)]
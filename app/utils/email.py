@@ -1,11 +1,20 @@
 # app/utils/email.py
 
 import os
-from typing import Optional
+import asyncio
+from typing import Callable, List, Optional, Set
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import queue
+import threading
 import smtplib
+import ssl
+from pathlib import Path
+
+from jinja2 import BaseLoader, ChoiceLoader, Environment, FileSystemLoader, ModuleLoader, select_autoescape
+
+from app.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +25,12 @@ SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 FROM_EMAIL = os.getenv("FROM_EMAIL", SMTP_USER)
 FROM_NAME = os.getenv("FROM_NAME", "Trading Bot Backend")
+# Máximo de conexiones SMTP abiertas a la vez por proceso (en uso + libres en el pool);
+# los envíos que no consiguen una esperan. Ajustar al límite del proveedor
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "8"))
+SMTP_TIMEOUT = 10
+# Destinatarios por mensaje en envíos masivos
+BULK_BATCH_SIZE = 50
 
 # ============================================================================
 # EMAIL SENDER
@@ -40,105 +55,313 @@ def send_email(
         True si se envió correctamente, False si hubo error
     """
     try:
-        # Crear mensaje
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
-        message["To"] = to_email
-        
-        # Agregar contenido
-        if plain_content:
-            part1 = MIMEText(plain_content, "plain")
-            message.attach(part1)
-        
-        part2 = MIMEText(html_content, "html")
-        message.attach(part2)
-        
-        # Enviar email
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            if SMTP_USER and SMTP_PASSWORD:
-                server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(FROM_EMAIL, to_email, message.as_string())
-        
-        logger.info(f"Email enviado exitosamente a {to_email}")
+        _smtp_send(to_email, subject, html_content, plain_content)
+        logger.info("Email enviado exitosamente a %s", to_email)
         return True
         
     except Exception as e:
-        logger.error(f"Error enviando email a {to_email}: {str(e)}")
+        logger.error("Error enviando email a %s: %s", to_email, e, exc_info=True)
         return False
 
+def send_bulk_email(
+    to_emails: List[str],
+    subject: str,
+    html_content: str,
+    plain_content: Optional[str] = None
+) -> int:
+    """
+    Enviar el mismo email a muchos destinatarios (ej: anuncios).
+    
+    Un solo mensaje por lote de BULK_BATCH_SIZE destinatarios (un MAIL FROM y
+    varios RCPT TO); los destinatarios van solo en el sobre SMTP, así que no
+    se ven entre ellos.
+    
+    Returns:
+        Número de destinatarios a los que se envió
+    """
+    message = _build_message(FROM_EMAIL, subject, html_content, plain_content)
+    sent = 0
+    for batch in _batches(to_emails):
+        try:
+            _send_message(batch, message)
+            sent += len(batch)
+        except Exception as e:
+            logger.error("Error enviando email masivo a %d destinatarios: %s", len(batch), e, exc_info=True)
+    logger.info("Email masivo enviado a %d/%d destinatarios", sent, len(to_emails))
+    return sent
+
+def _batches(to_emails: List[str]) -> List[List[str]]:
+    """Partir los destinatarios en lotes de BULK_BATCH_SIZE (límite de RCPT de Gmail/SES)"""
+    return [to_emails[i:i + BULK_BATCH_SIZE] for i in range(0, len(to_emails), BULK_BATCH_SIZE)]
+
+def _build_message(
+    to_header: str,
+    subject: str,
+    html_content: str,
+    plain_content: Optional[str] = None
+) -> MIMEMultipart:
+    """Construir el mensaje MIME (texto plano opcional + HTML)"""
+    # Crear mensaje
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
+    message["To"] = to_header
+    
+    # Agregar contenido
+    if plain_content:
+        part1 = MIMEText(plain_content, "plain")
+        message.attach(part1)
+    
+    part2 = MIMEText(html_content, "html")
+    message.attach(part2)
+    return message
+
+def _smtp_send(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    plain_content: Optional[str] = None
+):
+    """Construir el mensaje y enviarlo por SMTP (los errores se propagan)"""
+    _send_message([to_email], _build_message(to_email, subject, html_content, plain_content))
+
+def _send_message(recipients: List[str], message: MIMEMultipart):
+    """Enviar un mensaje a uno o varios destinatarios con una conexión del pool"""
+    with _connection_slots:
+        server = _acquire()
+        try:
+            server.sendmail(FROM_EMAIL, recipients, message.as_string())
+        except Exception:
+            # La conexión puede haber quedado en un estado inválido: no se devuelve al pool
+            _close(server)
+            raise
+        _release(server)
+
 # ============================================================================
-# EMAIL TEMPLATES
+# POOL DE CONEXIONES SMTP
 # ============================================================================
 
-def send_verification_email(email: str, code: str) -> bool:
+# Contexto TLS compartido por todas las conexiones: los certificados de CA se
+# cargan una sola vez (y, a diferencia del contexto por defecto de starttls(),
+# se verifica el certificado del servidor)
+_SSL_CONTEXT = ssl.create_default_context()
+
+# Conexiones libres; queue.Queue ya es thread-safe (los envíos corren en threads o en el worker)
+_pool: "queue.Queue[smtplib.SMTP]" = queue.Queue(maxsize=SMTP_POOL_SIZE)
+
+# Un permiso por conexión: solo se abre una nueva si el pool está vacío, así que
+# nunca hay más de SMTP_POOL_SIZE conexiones abiertas (con gevent, threading está parcheado)
+_connection_slots = threading.BoundedSemaphore(SMTP_POOL_SIZE)
+
+def _connect() -> smtplib.SMTP:
+    """Abrir una conexión nueva: STARTTLS + login"""
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    try:
+        server.starttls(context=_SSL_CONTEXT)
+        if SMTP_USER and SMTP_PASSWORD:
+            server.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        _close(server)
+        raise
+    return server
+
+def _acquire() -> smtplib.SMTP:
     """
-    Enviar email de verificación con código.
+    Tomar una conexión viva del pool, o abrir una nueva si no hay.
     
-    Args:
-        email: Email del destinatario
-        code: Código de verificación de 6 dígitos
-        
-    Returns:
-        True si se envió correctamente
+    Las conexiones del pool se comprueban con NOOP: si el servidor las cerró
+    (timeout de inactividad, SMTPServerDisconnected) se descartan.
     """
-    subject = "Verifica tu email - Trading Bot Backend"
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-            .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-            .code {{ background: #667eea; color: white; font-size: 32px; font-weight: bold; padding: 20px; text-align: center; border-radius: 8px; letter-spacing: 8px; margin: 20px 0; }}
-            .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🚀 Verifica tu Email</h1>
-            </div>
-            <div class="content">
-                <p>Hola,</p>
-                <p>Gracias por registrarte en <strong>Trading Bot Backend</strong>.</p>
-                <p>Para completar tu registro, por favor usa el siguiente código de verificación:</p>
-                <div class="code">{code}</div>
-                <p>Este código expirará en <strong>15 minutos</strong>.</p>
-                <p>Si no solicitaste este código, puedes ignorar este email.</p>
-                <p>Saludos,<br>El equipo de Trading Bot Backend</p>
-            </div>
-            <div class="footer">
-                <p>Este es un email automático, por favor no respondas.</p>
-            </div>
-        </div>
-    </body>
-    </html>
+    while True:
+        try:
+            server = _pool.get_nowait()
+        except queue.Empty:
+            return _connect()
+        try:
+            if server.noop()[0] == 250:
+                return server
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close(server)
+
+def _release(server: smtplib.SMTP):
+    """Devolver una conexión al pool (se cierra si el pool ya está lleno)"""
+    try:
+        _pool.put_nowait(server)
+    except queue.Full:
+        _close(server)
+
+def _close(server: smtplib.SMTP):
+    """Cerrar una conexión ignorando errores (puede estar ya cortada)"""
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+if celery_app is not None:
+    @celery_app.task(
+        name="app.utils.email.send_email_task",
+        queue="mail",
+        # OSError: conexión rechazada, DNS, timeouts de socket (fallos de red transitorios)
+        autoretry_for=(smtplib.SMTPException, OSError),
+        max_retries=5,
+        retry_backoff=60,
+        retry_jitter=True
+    )
+    def send_email_task(
+        to_email: str,
+        subject: str,
+        html_content: str,
+        plain_content: Optional[str] = None
+    ):
+        """Tarea de Celery: enviar un email, reintentando con backoff si falla el SMTP"""
+        _smtp_send(to_email, subject, html_content, plain_content)
+        logger.info("Email enviado exitosamente a %s", to_email)
+
+    @celery_app.task(
+        name="app.utils.email.send_bulk_email_task",
+        queue="mail",
+        # OSError: conexión rechazada, DNS, timeouts de socket (fallos de red transitorios)
+        autoretry_for=(smtplib.SMTPException, OSError),
+        max_retries=5,
+        retry_backoff=60,
+        retry_jitter=True
+    )
+    def send_bulk_email_task(
+        recipients: List[str],
+        subject: str,
+        html_content: str,
+        plain_content: Optional[str] = None
+    ):
+        """Tarea de Celery: enviar un lote de send_bulk_email (un solo mensaje)"""
+        _send_message(recipients, _build_message(FROM_EMAIL, subject, html_content, plain_content))
+        logger.info("Email masivo enviado a %d destinatarios", len(recipients))
+
+def deliver_email(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    plain_content: Optional[str] = None
+) -> bool:
     """
+    Encolar el email en Celery si hay broker configurado; si no, enviarlo por SMTP.
     
-    plain_content = f"""
-    Verifica tu Email - Trading Bot Backend
+    Returns:
+        True si se encoló o envió correctamente, False si hubo error
+    """
+    if celery_app is None:
+        return send_email(to_email, subject, html_content, plain_content)
     
-    Hola,
+    try:
+        send_email_task.delay(to_email, subject, html_content, plain_content)
+        return True
+    except Exception as e:
+        logger.error("Error encolando email a %s: %s", to_email, e, exc_info=True)
+        return False
+
+def deliver_bulk_email(
+    to_emails: List[str],
+    subject: str,
+    html_content: str,
+    plain_content: Optional[str] = None
+) -> int:
+    """
+    Encolar un email masivo en Celery (una tarea por lote, los workers los
+    envían en paralelo) o enviarlo directamente si no hay broker.
     
-    Gracias por registrarte en Trading Bot Backend.
+    Returns:
+        Número de destinatarios encolados o enviados
+    """
+    if celery_app is None:
+        return send_bulk_email(to_emails, subject, html_content, plain_content)
     
-    Tu código de verificación es: {code}
+    queued = 0
+    for batch in _batches(to_emails):
+        try:
+            send_bulk_email_task.delay(batch, subject, html_content, plain_content)
+            queued += len(batch)
+        except Exception as e:
+            logger.error("Error encolando email masivo a %d destinatarios: %s", len(batch), e, exc_info=True)
+    return queued
+
+# Referencias a los envíos en curso (asyncio solo guarda referencias débiles a las tareas)
+_pending_sends: Set[asyncio.Task] = set()
+
+def send_in_background(send: Callable[..., bool], *args) -> asyncio.Task:
+    """
+    Enviar un email en un thread sin esperar al servidor SMTP.
     
-    Este código expirará en 15 minutos.
+    Debe llamarse desde el event loop (ej: dentro de un endpoint). Los errores
+    no se propagan: send_email ya los registra y devuelve False.
     
-    Si no solicitaste este código, puedes ignorar este email.
+    Args:
+        send: Función de envío (send_verification_email, send_welcome_email, ...)
+        *args: Argumentos de la función
+        
+    Returns:
+        Tarea del envío (no hace falta esperarla)
+    """
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(send, *args))
+    _pending_sends.add(task)
+    task.add_done_callback(_pending_sends.discard)
+    return task
+
+# ============================================================================
+# EMAIL TEMPLATES
+# ============================================================================
+
+EMAIL_TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+# Templates ya compilados a módulos Python (ver compile_email_templates); vacío = compilar al importar
+EMAIL_TEMPLATES_COMPILED_DIR = os.getenv("EMAIL_TEMPLATES_COMPILED_DIR", "")
+
+def _template_loader() -> BaseLoader:
+    """
+    ModuleLoader si hay templates precompilados (sin parsear nada al arrancar),
+    con FileSystemLoader como respaldo para los que falten.
+    """
+    source_loader = FileSystemLoader(EMAIL_TEMPLATES_DIR)
+    if EMAIL_TEMPLATES_COMPILED_DIR and os.path.isdir(EMAIL_TEMPLATES_COMPILED_DIR):
+        return ChoiceLoader([ModuleLoader(EMAIL_TEMPLATES_COMPILED_DIR), source_loader])
+    return source_loader
+
+# Templates cargados una sola vez al importar (auto_reload=False: sin
+# comprobar el mtime de los archivos en cada render)
+_env = Environment(
+    loader=_template_loader(),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    cache_size=-1
+)
+_TEMPLATES = {
+    name: (_env.get_template(f"{name}.html"), _env.get_template(f"{name}.txt"))
+    for name in ("verify", "reset", "welcome")
+}
+
+def compile_email_templates(target_dir: str):
+    """
+    Compilar los templates de email a módulos Python (paso de build/deploy).
     
-    Saludos,
-    El equipo de Trading Bot Backend
+    Ej: python -c "from app.utils.email import compile_email_templates; compile_email_templates('app/compiled_templates')"
+    y arrancar con EMAIL_TEMPLATES_COMPILED_DIR=app/compiled_templates. Hay que
+    volver a compilar cada vez que cambie un template.
+    """
+    source_env = Environment(loader=FileSystemLoader(EMAIL_TEMPLATES_DIR), autoescape=select_autoescape(["html"]))
+    source_env.compile_templates(target_dir, zip=None)
+
+def send_verification_email(email: str, code: str) -> bool:
     """
+    Enviar email de verificación con código.
     
-    return send_email(email, subject, html_content, plain_content)
+    Args:
+        email: Email del destinatario
+        code: Código de verificación de 6 dígitos
+        
+    Returns:
+        True si se envió correctamente
+    """
+    subject = "Verifica tu email - Trading Bot Backend"
+    html, plain = _TEMPLATES["verify"]
+    return deliver_email(email, subject, html.render(code=code), plain.render(code=code))
 
 def send_password_reset_email(email: str, reset_token: str) -> bool:
     """
@@ -156,66 +379,8 @@ def send_password_reset_email(email: str, reset_token: str) -> bool:
     reset_link = f"{frontend_url}/reset-password?token={reset_token}"
     
     subject = "Restablece tu contraseña - Trading Bot Backend"
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-            .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-            .button {{ display: inline-block; background: #667eea; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; font-weight: bold; }}
-            .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🔒 Restablece tu Contraseña</h1>
-            </div>
-            <div class="content">
-                <p>Hola,</p>
-                <p>Recibimos una solicitud para restablecer la contraseña de tu cuenta en <strong>Trading Bot Backend</strong>.</p>
-                <p>Haz clic en el siguiente botón para crear una nueva contraseña:</p>
-                <p style="text-align: center;">
-                    <a href="{reset_link}" class="button">Restablecer Contraseña</a>
-                </p>
-                <p>O copia y pega este enlace en tu navegador:</p>
-                <p style="background: #fff; padding: 10px; border-radius: 5px; word-break: break-all;">{reset_link}</p>
-                <p>Este enlace expirará en <strong>1 hora</strong>.</p>
-                <p>Si no solicitaste restablecer tu contraseña, puedes ignorar este email.</p>
-                <p>Saludos,<br>El equipo de Trading Bot Backend</p>
-            </div>
-            <div class="footer">
-                <p>Este es un email automático, por favor no respondas.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    plain_content = f"""
-    Restablece tu Contraseña - Trading Bot Backend
-    
-    Hola,
-    
-    Recibimos una solicitud para restablecer la contraseña de tu cuenta.
-    
-    Haz clic en el siguiente enlace para crear una nueva contraseña:
-    {reset_link}
-    
-    Este enlace expirará en 1 hora.
-    
-    Si no solicitaste restablecer tu contraseña, puedes ignorar este email.
-    
-    Saludos,
-    El equipo de Trading Bot Backend
-    """
-    
-    return send_email(email, subject, html_content, plain_content)
+    html, plain = _TEMPLATES["reset"]
+    return deliver_email(email, subject, html.render(reset_link=reset_link), plain.render(reset_link=reset_link))
 
 def send_welcome_email(email: str, name: str) -> bool:
     """
@@ -229,59 +394,5 @@ def send_welcome_email(email: str, name: str) -> bool:
         True si se envió correctamente
     """
     subject = "¡Bienvenido a Trading Bot Backend! 🎉"
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-            .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-            .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🎉 ¡Bienvenido!</h1>
-            </div>
-            <div class="content">
-                <p>Hola {name},</p>
-                <p>¡Tu cuenta ha sido verificada exitosamente!</p>
-                <p>Ya puedes comenzar a usar <strong>Trading Bot Backend</strong> para analizar tus operaciones de trading.</p>
-                <p><strong>Características disponibles:</strong></p>
-                <ul>
-                    <li>📊 Análisis avanzado de operaciones</li>
-                    <li>📈 Curvas de capital en tiempo real</li>
-                    <li>🎯 KPIs profesionales</li>
-                    <li>📉 Análisis de drawdown</li>
-                    <li>🔥 Heatmaps de rendimiento</li>
-                </ul>
-                <p>¡Comienza a optimizar tu trading ahora!</p>
-                <p>Saludos,<br>El equipo de Trading Bot Backend</p>
-            </div>
-            <div class="footer">
-                <p>Este es un email automático, por favor no respondas.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    plain_content = f"""
-    ¡Bienvenido a Trading Bot Backend!
-    
-    Hola {name},
-    
-    ¡Tu cuenta ha sido verificada exitosamente!
-    
-    Ya puedes comenzar a usar Trading Bot Backend para analizar tus operaciones de trading.
-    
-    Saludos,
-    El equipo de Trading Bot Backend
-    """
-    
-    return send_email(email, subject, html_content, plain_content)
+    html, plain = _TEMPLATES["welcome"]
+    return deliver_email(email, subject, html.render(name=name), plain.render(name=name))
@@ -1,19 +1,72 @@
 # app/utils/security.py
 
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+from cachetools import TTLCache
 import jwt
+import orjson
 import os
+import hmac
+import hashlib
+import secrets
+import threading
+import time
 from app.schemas.auth import TokenPayload, UserRole
 
 # Configuración
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 días
+TOKEN_CACHE_TTL = 30  # segundos
+
+# Cache token -> TokenClaims ya verificados (evita HMAC + decode en cada request)
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+
+# Cache (HMAC(password), hash) -> bool para no repetir bcrypt con las mismas credenciales.
+# Las verificaciones corren en threads (asyncio.to_thread) y TTLCache no es thread-safe
+VERIFY_CACHE_TTL = 60  # segundos
+_VERIFY_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=VERIFY_CACHE_TTL)
+_VERIFY_CACHE_LOCK = threading.Lock()
+
+# Coste de bcrypt (2^rounds iteraciones); ajustar al hardware del servidor
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+class _OrjsonJWT(jwt.PyJWT):
+    """
+    PyJWT serializando los claims con orjson.
+    
+    _encode_payload/_decode_payload son métodos internos (privados) de PyJWT
+    y su firma puede cambiar en otra versión. test_orjson_jwt_roundtrip
+    (tests/test_security.py) verifica con la versión fijada en requirements.txt
+    que se siguen usando y que los tokens son compatibles con jwt.decode;
+    repetirlo al subir PyJWT.
+    """
+    
+    def _encode_payload(self, payload, headers=None, json_encoder=None) -> bytes:
+        if json_encoder is not None:
+            # Encoder propio pedido por el llamador: serializar como PyJWT
+            return super()._encode_payload(payload, headers, json_encoder)
+        return orjson.dumps(payload)
+    
+    def _decode_payload(self, decoded) -> dict:
+        try:
+            payload = orjson.loads(decoded["payload"])
+        except orjson.JSONDecodeError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}") from e
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+        return payload
+
+# Codificador/decodificador JWT y opciones fijas, construidos una sola vez.
+# Todos los tokens (acceso y reset) llevan exp: uno sin exp se rechaza
+_JWT = _OrjsonJWT()
+_JWT_HEADER = {"typ": "JWT", "alg": ALGORITHM}
+_ALGORITHMS = [ALGORITHM]
+_DECODE_OPTIONS = {"require": ["exp"]}
 
 # Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # ============================================================================
 # PASSWORD FUNCTIONS
@@ -35,6 +88,9 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verificar si una contraseña coincide con su hash.
     
+    El resultado se cachea VERIFY_CACHE_TTL segundos por (HMAC de la
+    contraseña, hash), así que el cache nunca guarda contraseñas en claro.
+    
     Args:
         plain_password: Contraseña en texto plano
         hashed_password: Hash de la contraseña
@@ -42,12 +98,31 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         True si coinciden, False si no
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    key = (hmac.new(SECRET_KEY.encode(), plain_password.encode(), hashlib.sha256).digest(), hashed_password)
+    with _VERIFY_CACHE_LOCK:
+        cached = _VERIFY_CACHE.get(key)
+    if cached is not None:
+        return cached
+    
+    result = pwd_context.verify(plain_password, hashed_password)
+    with _VERIFY_CACHE_LOCK:
+        _VERIFY_CACHE[key] = result
+    return result
 
 # ============================================================================
 # JWT TOKEN FUNCTIONS
 # ============================================================================
 
+def _expiry(seconds: float) -> tuple[int, datetime]:
+    """
+    Expiración dentro de `seconds` segundos.
+    
+    Returns:
+        Tupla (exp en segundos POSIX para el JWT, mismo instante como datetime UTC naive)
+    """
+    exp_ts = int(time.time() + seconds)
+    return exp_ts, datetime.fromtimestamp(exp_ts, timezone.utc).replace(tzinfo=None)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> tuple[str, datetime]:
     """
     Crear un JWT access token.
@@ -62,27 +137,60 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        exp_ts, expire = _expiry(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        exp_ts, expire = _expiry(ACCESS_TOKEN_EXPIRE_MINUTES * 60)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": exp_ts})
+    encoded_jwt = _JWT.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM, headers=_JWT_HEADER)
     
     return encoded_jwt, expire
 
-def verify_token(token: str) -> Optional[TokenPayload]:
+class TokenClaims(NamedTuple):
+    """
+    Claims de un access token verificado.
+    
+    Tupla ligera para el camino de cada request (verify_token); el schema
+    TokenPayload solo se construye donde haga falta serializarlo (to_schema).
+    """
+    sub: str  # user_id
+    email: str
+    role: UserRole
+    exp: int  # segundos POSIX
+    
+    def to_schema(self) -> TokenPayload:
+        """Convertir al schema de pydantic (exp como datetime local)"""
+        return TokenPayload(sub=self.sub, email=self.email, role=self.role, exp=datetime.fromtimestamp(self.exp))
+
+def verify_token(token: str) -> Optional[TokenClaims]:
     """
     Verificar y decodificar un JWT token.
     
+    Los tokens válidos se cachean durante TOKEN_CACHE_TTL segundos; un token
+    cacheado que ya expiró se descarta y se trata como inválido.
+    
     Args:
         token: JWT token a verificar
         
     Returns:
-        TokenPayload si el token es válido, None si no
+        TokenClaims si el token es válido, None si no
     """
+    payload = _TOKEN_CACHE.get(token)
+    if payload is not None:
+        if payload.exp > time.time():
+            return payload
+        _TOKEN_CACHE.pop(token, None)
+        return None
+    
+    payload = _decode_access_token(token)
+    if payload is not None:
+        _TOKEN_CACHE[token] = payload
+    return payload
+
+def _decode_access_token(token: str) -> Optional[TokenClaims]:
+    """Verificar firma y expiración de un JWT y construir sus TokenClaims (sin cache)"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _JWT.decode(token, SECRET_KEY, algorithms=_ALGORITHMS, options=_DECODE_OPTIONS)
         
         user_id: str = payload.get("sub")
         email: str = payload.get("email")
@@ -92,12 +200,8 @@ def verify_token(token: str) -> Optional[TokenPayload]:
         if user_id is None or email is None:
             return None
         
-        return TokenPayload(
-            sub=user_id,
-            email=email,
-            role=UserRole(role) if role else UserRole.USER,
-            exp=datetime.fromtimestamp(exp)
-        )
+        # Claims firmados por nosotros: no hace falta validarlos con pydantic
+        return TokenClaims(user_id, email, UserRole(role) if role else UserRole.USER, exp)
     except jwt.PyJWTError:
         return None
 
@@ -112,7 +216,7 @@ def decode_token(token: str) -> Optional[dict]:
         Payload del token o None si es inválido
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _JWT.decode(token, SECRET_KEY, algorithms=_ALGORITHMS, options=_DECODE_OPTIONS)
         return payload
     except jwt.PyJWTError:
         return None
@@ -123,13 +227,12 @@ def decode_token(token: str) -> Optional[dict]:
 
 def generate_verification_code() -> str:
     """
-    Generar un código de verificación de 6 dígitos.
+    Generar un código de verificación de 6 dígitos (CSPRNG, no predecible).
     
     Returns:
         Código de 6 dígitos
     """
-    import random
-    return ''.join([str(random.randint(0, 9)) for _ in range(6)])
+    return f"{secrets.randbelow(1_000_000):06d}"
 
 def create_reset_token(email: str) -> tuple[str, datetime]:
     """
@@ -141,11 +244,11 @@ def create_reset_token(email: str) -> tuple[str, datetime]:
     Returns:
         Tupla (token, expires_at)
     """
-    expire = datetime.utcnow() + timedelta(hours=1)  # Expira en 1 hora
+    exp_ts, expire = _expiry(60 * 60)  # Expira en 1 hora
     to_encode = {
         "email": email,
         "type": "password_reset",
-        "exp": expire
+        "exp": exp_ts
     }
-    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    token = _JWT.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM, headers=_JWT_HEADER)
     return token, expire
@@ -0,0 +1,28 @@
+# tests/conftest.py
+
+import shutil
+from pathlib import Path
+
+import pytest
+from app.services import cache, latest_csv, snapshot
+
+# Reporte MT5 de ejemplo usado como único archivo de datos en los tests
+SAMPLE_FILE = Path(__file__).resolve().parent.parent / "data" / "raw" / "reporte25-11.xlsx"
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path_factory, monkeypatch):
+    """Guardar los snapshots de analytics en un directorio temporal, no en data/cache"""
+    path = tmp_path_factory.mktemp("cache")
+    monkeypatch.setattr(snapshot, "DATA_CACHE_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def raw_dir(tmp_path, monkeypatch):
+    """Directorio de datos temporal con un único archivo MT5"""
+    shutil.copy(SAMPLE_FILE, tmp_path / SAMPLE_FILE.name)
+    monkeypatch.setattr(latest_csv, "RAW_DATA_DIR", str(tmp_path))
+    cache.clear_cache()
+    yield tmp_path
+    cache.clear_cache()
@@ -1,8 +1,11 @@
 # tests/test_analytics.py
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.analytics_service import AnalyticsService
 
 client = TestClient(app)
 
@@ -43,8 +46,44 @@ def test_get_symbol_stats_without_data():
     assert response.status_code in [404, 500]
 
 
+def test_etag_returns_304_when_unchanged(raw_dir):
+    """Con el mismo archivo, If-None-Match devuelve 304 sin cuerpo"""
+    response = client.get("/api/v1/analytics/summary")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+
+    response = client.get("/api/v1/analytics/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/api/v1/analytics/filter", headers={"If-None-Match": 'W/"otro"'})
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
+
+
+def test_filter_ndjson_matches_json(raw_dir):
+    """format=ndjson devuelve las mismas operaciones, una por línea"""
+    trades = client.get("/api/v1/analytics/filter?status=GANADOR").json()["trades"]
+
+    response = client.get("/api/v1/analytics/filter?status=GANADOR&format=ndjson")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert int(response.headers["x-results-count"]) == len(trades)
+    assert [json.loads(line) for line in response.text.splitlines()] == trades
+
+
 # TODO: Agregar tests con datos de prueba
 # - Test de upload de CSV
 # - Test de cálculo de KPIs
 # - Test de filtrado
 # - Test de series temporales
+
+
+def test_analytics_without_trades():
+    """Sin operaciones se devuelven métricas a cero con todas las distribuciones"""
+    analytics = AnalyticsService.calculate_all_analytics([])
+
+    assert analytics.total_trades == 0
+    assert analytics.equity_curve == []
+    assert set(analytics.profit_distribution.values()) == {0}
+    assert json.loads(analytics.model_dump_json())["period_start"] == ""
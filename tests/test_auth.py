@@ -0,0 +1,52 @@
+# tests/test_auth.py
+
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.schemas.auth import SessionResponse, UserResponse
+from app.services import auth_service
+
+client = TestClient(app)
+
+
+def test_missing_bearer_token():
+    """Sin header Authorization se responde 401"""
+    response = client.get("/api/v1/auth/users/me")
+    assert response.status_code == 401
+    assert response.json()["detail"] == "No autorizado"
+
+
+def test_non_bearer_scheme():
+    """Un header que no es Bearer se rechaza igual que uno ausente"""
+    response = client.post("/api/v1/auth/sign-out", headers={"Authorization": "Basic abc"})
+    assert response.status_code == 401
+
+
+def test_invalidate_user_drops_all_cached_tokens():
+    """Cambiar el password invalida en cache todas las sesiones del usuario"""
+    user = UserResponse(_id="u1", email="trader@example.com", name="Trader",
+                        email_verified=True, created_at=datetime.utcnow())
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    for token in ("t1", "t2"):
+        auth_service._cache_session(SessionResponse(user=user, token=token, expires_at=expires_at))
+
+    auth_service._invalidate_user("u1")
+
+    assert "t1" not in auth_service._SESSION_CACHE
+    assert "t2" not in auth_service._SESSION_CACHE
+
+
+def test_revoked_session_not_cached_again():
+    """Una lectura en curso durante el sign-out/reset no vuelve a cachear la sesión revocada"""
+    user = UserResponse(_id="u2", email="otro@example.com", name="Otro",
+                        email_verified=True, created_at=datetime.utcnow())
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+
+    auth_service._invalidate_token("t3")
+    auth_service._cache_session(SessionResponse(user=user, token="t3", expires_at=expires_at))
+    assert "t3" not in auth_service._SESSION_CACHE
+
+    auth_service._invalidate_user("u2")
+    auth_service._cache_session(SessionResponse(user=user, token="t4", expires_at=expires_at))
+    assert "t4" not in auth_service._SESSION_CACHE
@@ -0,0 +1,73 @@
+# tests/test_cache.py
+
+import os
+import shutil
+
+from app.services import cache, latest_csv
+from tests.conftest import SAMPLE_FILE
+
+
+def test_latest_file_without_data(tmp_path, monkeypatch):
+    """Sin archivos no hay archivo más reciente"""
+    monkeypatch.setattr(latest_csv, "RAW_DATA_DIR", str(tmp_path))
+    cache.clear_cache()
+    assert cache.get_latest_file() is None
+
+
+def test_cached_analytics_reused(raw_dir):
+    """Dos llamadas con el mismo archivo devuelven los mismos objetos"""
+    latest = cache.get_latest_file()
+    assert latest[0].endswith(SAMPLE_FILE.name)
+
+    table, analytics = cache.get_cached(latest)
+    table_again, analytics_again = cache.get_cached(cache.get_latest_file())
+
+    assert table is table_again
+    assert analytics is analytics_again
+    assert analytics.total_trades == len(table) > 0
+
+
+def test_cache_invalidated_when_file_changes(raw_dir):
+    """Si cambia el mtime del archivo se vuelve a parsear"""
+    latest = cache.get_latest_file()
+    _, analytics = cache.get_cached(latest)
+
+    path = raw_dir / SAMPLE_FILE.name
+    os.utime(path, ns=(latest[1] + 10**9, latest[1] + 10**9))
+
+    new_latest = cache.get_latest_file()
+    assert new_latest != latest
+    assert cache.get_cached(new_latest)[1] is not analytics
+
+
+def test_set_latest_file_points_to_upload(raw_dir):
+    """Un archivo recién subido pasa a ser el más reciente sin re-escanear"""
+    uploaded = raw_dir / "subido.xlsx"
+    shutil.copy(SAMPLE_FILE, uploaded)
+
+    latest = cache.set_latest_file(str(uploaded))
+    assert cache.get_latest_file() == latest
+    assert latest[0] == str(uploaded)
+
+
+def test_analytics_snapshot_survives_cache_clear(raw_dir, snapshot_dir):
+    """Los analytics se guardan en disco y se reutilizan tras vaciar el cache en memoria"""
+    latest = cache.get_latest_file()
+    _, analytics = cache.get_cached(latest)
+    assert list(snapshot_dir.glob("*.analytics.json"))
+
+    cache._load_table.cache_clear()
+    cache._compute_analytics.cache_clear()
+    cached = cache.get_cached(latest)[1]
+
+    assert cached is not analytics
+    assert cached == analytics
+
+
+def test_summary_json_serialized_once(raw_dir):
+    """El JSON del resumen se reutiliza mientras el archivo no cambie"""
+    latest = cache.get_latest_file()
+    body = cache.get_cached_json(latest)
+
+    assert cache.get_cached_json(latest) is body
+    assert body == cache.get_cached(latest)[1].model_dump_json().encode()
@@ -0,0 +1,79 @@
+# tests/test_kernels.py
+
+import numpy as np
+import pandas as pd
+from app.services.kernels import (
+    hourly_stats, best_bucket, equity_and_drawdown,
+    group_stats, longest_runs, sorted_codes, bin_counts
+)
+from app.services.analytics_service import PROFIT_BINS, PROFIT_BIN_LABELS
+
+
+def test_hourly_stats():
+    """Sumas y conteos por hora en 24 posiciones"""
+    hours = np.array([0, 0, 5, 23])
+    profits = np.array([10.0, -4.0, 3.5, -1.0])
+
+    sums, counts = hourly_stats(hours, profits)
+
+    assert sums.shape == counts.shape == (24,)
+    assert sums[0] == 6.0 and counts[0] == 2
+    assert sums[5] == 3.5 and counts[5] == 1
+    assert counts.sum() == 4
+
+
+def test_best_bucket_ignores_empty_hours():
+    """Una hora sin operaciones no gana aunque todas las demás pierdan"""
+    sums, counts = hourly_stats(np.array([3, 7]), np.array([-5.0, -1.0]))
+    assert best_bucket(sums, counts) == 7
+
+
+def test_best_bucket_without_data():
+    """Sin operaciones la mejor hora es 0"""
+    sums, counts = hourly_stats(np.array([], dtype=int), np.array([]))
+    assert best_bucket(sums, counts) == 0
+
+
+def test_equity_and_drawdown():
+    """Drawdown en $ respecto al máximo acumulado de la curva de capital"""
+    equity, drawdown = equity_and_drawdown(np.array([100.0, -30.0, 50.0, -200.0]))
+
+    assert equity.tolist() == [100.0, 70.0, 120.0, -80.0]
+    assert drawdown.tolist() == [0.0, -30.0, 0.0, -200.0]
+
+
+def test_group_stats():
+    """Conteo, suma y ganadoras por grupo, incluidos los grupos vacíos"""
+    profit = np.array([10.0, -5.0, -1.0, 4.0])
+    counts, sums, wins = group_stats(np.array([0, 2, 0, 2]), 3, profit, profit > 0)
+
+    assert counts.tolist() == [2, 0, 2]
+    assert sums.tolist() == [9.0, 0.0, -1.0]
+    assert wins.tolist() == [1, 0, 1]
+
+
+def test_longest_runs():
+    """Los break-even cortan las rachas"""
+    sign = np.sign(np.array([1.0, 2.0, 0.0, 3.0, -1.0, -2.0, -3.0, 5.0]))
+    assert longest_runs(sign) == (2, 3)
+    assert longest_runs(np.array([])) == (0, 0)
+
+
+def test_sorted_codes_matches_unique():
+    """Mismo resultado que np.unique(return_inverse=True) sobre datos ordenados"""
+    keys = np.array([3, 3, 5, 8, 8, 8, 9])
+    values, codes = sorted_codes(keys)
+    expected_values, expected_codes = np.unique(keys, return_inverse=True)
+
+    assert values.tolist() == expected_values.tolist()
+    assert codes.tolist() == expected_codes.tolist()
+    assert sorted_codes(np.array([], dtype=np.int64))[1].size == 0
+
+
+def test_bin_counts_matches_pandas():
+    """Mismos conteos y etiquetas que value_counts(bins=...) de pandas"""
+    profits = np.array([-1500.0, -1000.0, -999.0, 0.0, 0.01, 100.0, 750.0, 5000.0, -50.0])
+    expected = pd.Series(profits).value_counts(bins=PROFIT_BINS, sort=False)
+
+    assert bin_counts(profits, PROFIT_BINS).tolist() == expected.tolist()
+    assert PROFIT_BIN_LABELS == [str(interval) for interval in expected.index]
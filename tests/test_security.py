@@ -0,0 +1,71 @@
+# tests/test_security.py
+
+from datetime import timedelta
+
+import jwt
+from app.utils import security
+
+
+def test_verify_token_is_cached():
+    """Un token válido se decodifica una vez y luego sale del cache"""
+    token, _ = security.create_access_token({"sub": "user-1", "email": "a@b.com", "role": "user"})
+
+    payload = security.verify_token(token)
+    assert payload.sub == "user-1"
+    assert security.verify_token(token) is payload
+    assert payload.to_schema().sub == "user-1"
+
+
+def test_verify_token_expired_cached_entry():
+    """Un payload cacheado que ya expiró no se devuelve"""
+    token, _ = security.create_access_token({"sub": "user-1", "email": "a@b.com"})
+    payload = security.verify_token(token)
+
+    expired = payload.exp - int(timedelta(days=30).total_seconds())
+    security._TOKEN_CACHE[token] = payload._replace(exp=expired)
+    assert security.verify_token(token) is None
+    assert token not in security._TOKEN_CACHE
+
+
+def test_verify_token_invalid():
+    """Tokens inválidos devuelven None y no se cachean"""
+    assert security.verify_token("no-es-un-jwt") is None
+    assert "no-es-un-jwt" not in security._TOKEN_CACHE
+
+
+def test_verification_code_format():
+    """Siempre 6 dígitos, con ceros a la izquierda si hace falta"""
+    codes = {security.generate_verification_code() for _ in range(200)}
+    assert all(len(code) == 6 and code.isdigit() for code in codes)
+    assert len(codes) > 1
+
+
+def test_verify_password_cached_without_plaintext():
+    """El resultado se cachea por (HMAC, hash) y la contraseña no queda en el cache"""
+    hashed = security.hash_password("secreta")
+
+    assert security.verify_password("secreta", hashed)
+    assert not security.verify_password("otra", hashed)
+    assert security.verify_password("secreta", hashed)
+
+    keys = [key for key in security._VERIFY_CACHE if key[1] == hashed]
+    assert len(keys) == 2
+    assert all(b"secreta" not in key[0] for key in keys)
+
+
+def test_orjson_jwt_roundtrip(monkeypatch):
+    """Los tokens pasan por los métodos con orjson y siguen siendo JWT estándar"""
+    calls = []
+    encode, decode = security._OrjsonJWT._encode_payload, security._OrjsonJWT._decode_payload
+    monkeypatch.setattr(security._OrjsonJWT, "_encode_payload",
+                        lambda self, *a, **k: calls.append("encode") or encode(self, *a, **k))
+    monkeypatch.setattr(security._OrjsonJWT, "_decode_payload",
+                        lambda self, *a, **k: calls.append("decode") or decode(self, *a, **k))
+
+    token, _ = security.create_access_token({"sub": "user-9", "email": "ñ@b.com", "role": "admin"})
+    claims = security._decode_access_token(token)
+    assert calls == ["encode", "decode"]
+
+    assert claims.sub == "user-9" and claims.email == "ñ@b.com" and claims.role == "admin"
+    standard = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+    assert standard == {"sub": "user-9", "email": "ñ@b.com", "role": "admin", "exp": claims.exp}
@@ -0,0 +1,52 @@
+# tests/test_trade_table.py
+
+import numpy as np
+import pandas as pd
+from app.services.trade_table import TradeTable
+
+
+def _table():
+    """Tabla pequeña con dos símbolos y los tres estados"""
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'open_time': pd.to_datetime(['2025-01-15 09:30', '2025-01-15 23:10', '2025-01-16 00:05']),
+        'close_time': pd.to_datetime(['2025-01-15 10:45', '2025-01-16 00:10', '2025-01-16 01:05']),
+        'symbol': ['EURUSD', 'GOLD', 'EURUSD'],
+        'order_type': ['BUY', 'SELL', 'BUY'],
+        'volume': [1.0, 0.5, 0.1],
+        'open_price': [1.085, 2650.0, 1.09],
+        'close_price': [1.087, 2660.0, 1.09],
+        'profit_usd': [200.0, -500.0, 0.0],
+        'profit_pct': [0.18, -0.04, 0.0],
+        'duration': [75, 60, 60],
+        'spread': [1.2, np.nan, 0.8],
+        'comment': ['SMA', None, 'nan'],
+        'status': ['GANADOR', 'PERDEDOR', 'BREAK_EVEN'],
+    })
+    return TradeTable.from_frame(df)
+
+
+def test_masks_use_category_codes():
+    """Los filtros por símbolo/estado funcionan y un valor inexistente no selecciona nada"""
+    table = _table()
+    assert table.symbol_mask('EURUSD').tolist() == [True, False, True]
+    assert table.status_mask('PERDEDOR').tolist() == [False, True, False]
+    assert not table.symbol_mask('GBPUSD').any()
+
+
+def test_open_hours():
+    """Hora de apertura calculada desde los nanosegundos"""
+    assert _table().open_hours().tolist() == [9, 23, 0]
+
+
+def test_to_models_only_selected_rows():
+    """Solo se materializan las filas seleccionadas, con escalares nativos"""
+    table = _table()
+    trades = table.to_models(np.flatnonzero(table.symbol_mask('GOLD')))
+
+    assert len(trades) == 1
+    trade = trades[0]
+    assert trade.id == 2 and trade.symbol == 'GOLD'
+    assert trade.open_time == pd.Timestamp('2025-01-15 23:10').to_pydatetime()
+    assert trade.spread is None and trade.comment is None
+    assert type(trade.profit_usd) is float